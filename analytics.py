@@ -0,0 +1,164 @@
+"""Fleet-wide capacity analytics computed in batch with NumPy."""
+import time
+
+import numpy as np
+
+import switchdb
+
+# Days of port history used for growth-rate forecasts
+HISTORY_DAYS = switchdb.HISTORY_DAYS
+# Forecast horizons (days) shown on the network-wide page
+FORECAST_DAYS = (30, 90)
+PERCENTILES = (50, 90, 95, 99)
+# Number of switches listed as closest to exhaustion
+TOP_EXHAUSTION = 10
+
+# Results are recomputed only when the collector has run since
+_cache = {'generation': None, 'result': None}
+
+
+def loadFleet(swDB):
+    """
+    Load the switches table into columnar arrays
+    """
+    rows = swDB.getCapacityStats()
+    names, ips, models, swvers, total, up = zip(*rows) if rows else ([],) * 6
+    fleet = {
+        'name': np.array(names, dtype=object),
+        'ip': np.array(ips, dtype=object),
+        'model': np.array(models, dtype=object),
+        'swver': np.array(swvers, dtype=object),
+        'total': np.array(total, dtype=np.float64),
+        'up': np.array(up, dtype=np.float64),
+    }
+    fleet['utilization'] = np.divide(fleet['up'] * 100, fleet['total'],
+                                     out=np.zeros_like(fleet['up']),
+                                     where=fleet['total'] > 0)
+    return fleet
+
+
+def loadHistory(swDB, ips, days=HISTORY_DAYS):
+    """
+    Load per-switch regression sums of port history as arrays aligned
+    with the fleet arrays. The database aggregates the samples, so only
+    one row per switch is fetched. Unknown switches are dropped
+    """
+    sums = np.zeros((5, len(ips)))
+    rows = swDB.getHistorySums(time.time() - days * 86400)
+    if not rows or not len(ips):
+        return sums
+    hist_ips = np.array([row[0] for row in rows], dtype=object)
+    values = np.array([row[1:] for row in rows], dtype=np.float64).T
+    order = np.argsort(ips)
+    pos = np.searchsorted(ips[order], hist_ips)
+    pos = np.minimum(pos, len(ips) - 1)
+    known = ips[order][pos] == hist_ips
+    sums[:, order[pos][known]] = values[:, known]
+    return sums
+
+
+def growthRates(sums):
+    """
+    Least-squares slope of up ports per day for every switch at once,
+    from the (n, sum t, sum up, sum t*t, sum t*up) rows of loadHistory.
+    Switches with fewer than two samples get a slope of 0
+    """
+    n, st, sy, stt, sty = sums
+    count = len(n)
+    denom = n * stt - st * st
+    # Tolerate rounding when all samples share one timestamp
+    flat = np.abs(denom) <= 1e-9 * np.maximum(n * stt, 1)
+    slope = np.divide(n * sty - st * sy, denom,
+                      out=np.zeros(count), where=(n >= 2) & ~flat)
+    return slope
+
+
+def groupStats(keys, utilization, total, up):
+    """
+    Utilization distribution per group (e.g. per model)
+    """
+    polled = total > 0
+    groups = []
+    if not polled.any():
+        return groups
+    labels, inverse = np.unique(keys[polled].astype(str), return_inverse=True)
+    util = utilization[polled]
+    counts = np.bincount(inverse)
+    ports = np.bincount(inverse, weights=total[polled])
+    used = np.bincount(inverse, weights=up[polled])
+    order = np.argsort(inverse, kind='stable')
+    splits = np.split(util[order], np.cumsum(counts)[:-1])
+    for label, count, port, use, values in zip(labels, counts, ports,
+                                               used, splits):
+        groups.append({
+            'name': str(label),
+            'switches': int(count),
+            'ports': int(port),
+            'utilization': round(float(use / port * 100), 1) if port else 0,
+            'p50': round(float(np.percentile(values, 50)), 1),
+            'p90': round(float(np.percentile(values, 90)), 1),
+            'max': round(float(values.max()), 1),
+        })
+    groups.sort(key=lambda group: group['ports'], reverse=True)
+    return groups
+
+
+def computeAnalytics(swDB):
+    """
+    Compute fleet percentiles, per-model distributions,
+    growth forecasts & time-to-exhaustion in batch
+    """
+    fleet = loadFleet(swDB)
+    count = len(fleet['ip'])
+    polled = fleet['total'] > 0
+    util = fleet['utilization'][polled]
+    slope = growthRates(loadHistory(swDB, fleet['ip']))
+    free = fleet['total'] - fleet['up']
+    growing = polled & (slope > 0)
+    days_to_full = np.full(count, np.inf)
+    days_to_full[growing] = free[growing] / slope[growing]
+
+    result = {
+        'switches': count,
+        'polled': int(polled.sum()),
+        'utilization': round(float(fleet['up'][polled].sum() * 100
+                                   / fleet['total'][polled].sum()), 1)
+        if polled.any() else 0,
+        'percentiles': [(p, round(float(v), 1)) for p, v in
+                        zip(PERCENTILES, np.percentile(util, PERCENTILES))]
+        if len(util) else [],
+        'models': groupStats(fleet['model'], fleet['utilization'],
+                             fleet['total'], fleet['up']),
+        'growth': round(float(slope.sum()), 2),
+        'forecast': [],
+        'exhaustion': [],
+    }
+    for days in FORECAST_DAYS:
+        projected = np.minimum(fleet['up'] + np.maximum(slope, 0) * days,
+                               fleet['total'])
+        result['forecast'].append(
+            (days, int(projected[polled].sum()),
+             int((projected[polled] >= fleet['total'][polled]).sum())))
+    for i in np.argsort(days_to_full)[:TOP_EXHAUSTION]:
+        if not np.isfinite(days_to_full[i]):
+            break
+        result['exhaustion'].append({
+            'name': fleet['name'][i],
+            'ip': fleet['ip'][i],
+            'utilization': round(float(fleet['utilization'][i]), 1),
+            'growth': round(float(slope[i]), 2),
+            'days': int(days_to_full[i]),
+        })
+    return result
+
+
+def getFleetAnalytics():
+    """
+    Return fleet analytics, cached until the collector runs again
+    """
+    with switchdb.DB() as swDB:
+        generation = swDB.getLastUpdate()
+        if _cache['generation'] != generation or _cache['result'] is None:
+            _cache['result'] = computeAnalytics(swDB)
+            _cache['generation'] = generation
+    return _cache['result']
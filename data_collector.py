@@ -1,21 +1,21 @@
 import os
-import yaml
+import time
 from scrapli.driver.core import IOSXEDriver, NXOSDriver
 import switchdb
+import sharding
+import health
+import inventory
 import csv
-from extract import json_extract
+from extract import iter_arp
 from socket import inet_aton
 import struct
-from itertools import zip_longest
 
 def loadDevices():
     """
     Load device inventory from config.yml
     """
     print("Loading devices from config file...")
-    with open("config.yml", 'r') as config:
-        devicelist = yaml.load(config)
-    return devicelist['Devices']
+    return inventory.loadInventory("config.yml")
 
 
 def connectToDevice(deviceconfig):
@@ -63,6 +63,14 @@ def getInterfaceInfo(device):
     save_raw_output(resp)
     # Parse raw CLI using Genie
     intdata = resp.genie_parse_output()
+    return summarizeInterfaces(intdata)
+
+
+def summarizeInterfaces(intdata):
+    """
+    Count port states, speeds & media from Genie-style
+    interface data. Shared by the SSH and SNMP collectors
+    """
     interfaceStats = {
         'total_port': 0,
         'up_port': 0,
@@ -77,7 +85,8 @@ def getInterfaceInfo(device):
         'intop100g': 0,
         'intmedcop': 0,
         'intmedsfp': 0,
-        'intmedvirtual': 0
+        'intmedvirtual': 0,
+        'interfaces': []
     }
     # Process each interface
     for iface in intdata:
@@ -89,6 +98,12 @@ def getInterfaceInfo(device):
             print(f'found management interface: {iface}')
             continue
         print(f"Working on interface {iface}")
+        # Keep per-interface state for exports
+        interfaceStats['interfaces'].append((iface,
+                                             intdata[iface]['enabled'],
+                                             intdata[iface].get('oper_status'),
+                                             intdata[iface].get('bandwidth'),
+                                             intdata[iface].get('media_type')))
         # Count all Ethernet interfaces
         interfaceStats['total_port'] += 1
         # Count admin-down interfaces
@@ -180,30 +195,16 @@ def addDeviceToDB(devicelist):
     Update DB entries for each switch from the config file
     """
     print("Opening DB connection...")
-    swDB = switchdb.DB()
-    # Get a list of current switches in the database
-    # Compare between new config file - see what should be added/removed
-    curswitches = swDB.getAllSummary()
-    currentSwitches = [row[3] for row in curswitches]
-    newSwitches = [devicelist[switch]['address'] for switch in devicelist]
-    swRemove = set(currentSwitches).difference(newSwitches)
-    swAdd = set(newSwitches).difference(currentSwitches)
-    # If switches to remove, purge from the database
+    with switchdb.DB() as swDB:
+        # Compare the config file with the database & apply
+        # all additions / removals in a single transaction
+        switches = {str(devicelist[switch]['address']): str(switch)
+                    for switch in devicelist}
+        swAdd, swRemove = swDB.syncSwitches(switches)
     if len(swRemove) > 0:
-        print(f"Found {len(swRemove)} switches no longer in config file")
-        for switchIP in swRemove:
-            print(f"Removing switch ({switchIP}) from DB...")
-            swDB.deleteSwitch(switchIP)
-
-    print("Adding devices to DB...")
-    for switch in devicelist:
-        switchIP = devicelist[switch]['address']
-        if switchIP in swAdd:
-            print(f"Adding switch ({switch} / {switchIP}) to DB...")
-            swDB.addSwitch(str(switch), str(switchIP))
-        else:
-            print(f"Switch ({switch} / {switchIP}) already in DB. Skipping...")
-    swDB.close()
+        print(f"Removed {len(swRemove)} switches no longer in config file")
+    print(f"Added {len(swAdd)} new switches, "
+          f"{len(switches) - len(swAdd)} already in DB")
 
 
 def updateDB(device, ip, sysinfo, portinfo):
@@ -211,30 +212,40 @@ def updateDB(device, ip, sysinfo, portinfo):
     Insert new system & port information
     into the database
     """
-    swDB = switchdb.DB()
-    print(f"Updating system info for {device} in DB...")
-    swDB.updateSysInfo(device, ip, sysinfo)
-    print(f"Updating port info for {device} in DB...")
-    swDB.updatePorts(device, ip, portinfo)
-    swDB.close()
+    with switchdb.DB() as swDB:
+        print(f"Updating system info for {device} in DB...")
+        swDB.updateSysInfo(device, ip, sysinfo)
+        print(f"Updating port info for {device} in DB...")
+        swDB.updatePorts(device, ip, portinfo)
+        swDB.addPortHistory(ip, portinfo)
+        swDB.replaceInterfaces(ip, portinfo['interfaces'])
 
-def add_used_ips(id, IP_used):
+def add_used_ips(IPs_used):
     """
-    Inset Used IP Addresses into the database
+    Replace Used IP Addresses in the database with one bulk insert.
+    IPs_used is an iterable of (id, IP) tuples
     """
-    swDB = switchdb.DB()
-    print(f'Adding Used IPs in the network to Database')
-    swDB.add_used_ip(id,IP_used)
-    swDB.close()
+    with switchdb.DB() as swDB:
+        print(f'Adding Used IPs in the network to Database')
+        swDB.replaceUsedIPs(IPs_used)
 
 def updateLastRun():
     """
     Call to DB - update last run time
     """
-    swDB = switchdb.DB()
-    print("Updating last run time in DB...")
-    swDB.updateLastRun()
-    swDB.close()
+    with switchdb.DB() as swDB:
+        print("Updating last run time in DB...")
+        swDB.updateLastRun()
+
+
+def pruneHistory():
+    """
+    Drop port history older than the retention window
+    """
+    with switchdb.DB() as swDB:
+        pruned = swDB.prunePortHistory(time.time() - switchdb.HISTORY_DAYS * 86400)
+    print(f"Pruned {pruned} port history samples older than "
+          f"{switchdb.HISTORY_DAYS} days")
 
 
 def updateCheckStatus(device, ip, status):
@@ -242,47 +253,63 @@ def updateCheckStatus(device, ip, status):
     Update the last_check database field,
     which indicates if the check passed or failed
     """
-    swDB = switchdb.DB()
-    print(f"Updating check status for {device} to {status}")
-    swDB.updateStatus(device, ip, status)
-    swDB.close()
+    with switchdb.DB() as swDB:
+        print(f"Updating check status for {device} to {status}")
+        swDB.updateStatus(device, ip, status)
+
+def pollSNMP(snmplist):
+    """
+    Poll devices with 'collector: snmp' concurrently.
+    pysnmp is only needed when such devices are configured
+    """
+    if not snmplist:
+        return {}
+    import snmp_collector
+    print(f"Polling {len(snmplist)} devices over SNMP...")
+    return snmp_collector.pollDevices(snmplist)
+
+
+def updateHealth(ip, devhealth):
+    """
+    Persist polling health, backoff & next poll time
+    """
+    with switchdb.DB() as swDB:
+        print(f"Device {ip} is {devhealth['state']}, "
+              f"next poll in {int(devhealth['next_poll'] - time.time())}s")
+        swDB.updateDeviceHealth(ip, devhealth)
+
+
+def usedips(device, mgmt_ip):
+    """
+    Save the ARP entries of an SSH-polled switch
+    """
+    resp1 = device.send_command("show ip arp")
+    sh_parsed = resp1.genie_parse_output()
+    add_device_ips(mgmt_ip, iter_arp(sh_parsed))
+
 
-open("list_ip_300.txt", 'w+').close()            #This will overwrite the file everytime getSystemInfoXE is run and avoids txt file from overgrowing on local machine.
-def usedips(device):
-    with open('list_ip_300.txt', 'a') as file:      ## Open/Create the file for saving IP List
-        resp1 = device.send_command("show ip arp")
-        sh_parsed = resp1.genie_parse_output()
-        ips = json_extract(sh_parsed,'ip')
-        file.write(str(ips))
-        file.write('\n')
+def add_device_ips(mgmt_ip, arp_records):
+    """
+    Save the ARP entries learned from one switch.
+    Keep the per-switch list in the DB so switches skipped
+    this sweep still contribute their last known IPs
+    """
+    with switchdb.DB() as swDB:
+        swDB.replaceDeviceIPs(mgmt_ip, arp_records)
 
 ## Function to print out unique ip list from "Show ip arp" result from all devices
 
-def csv_write(iteration,devicelist):
-    if iteration == len(devicelist):
-        with open('list_ip_300.txt') as file:
-            fields = file.read().split()
-            output = []
-            for each in fields:
-                ip = each.strip("'[]\,")
-                output.append(ip)
-            unique_list = set(output)      #Remove Duplicate IP entries from the list. Since "Sh ip arp" is run on both switches, they might have similar IP entries.
-            sorted_list = sorted(unique_list, key=lambda ip: struct.unpack("!L", inet_aton(ip))[0])  #Sort the IP address in Ascending Order
-            id = 0
-            for each_ip in sorted_list:
-                id +=1
-                ips = each_ip
-                add_used_ips(id, ips)
-        #
-        #Below block of code will write the IP list to CSV file.
-        tmp = [x for x in range(1,(len(sorted_list) + 1))]
-
-        new_sort = [tmp,sorted_list]
-        export_data = zip_longest(*new_sort, fillvalue='')
-        with open('consumed_ips.csv', 'w', encoding="ISO-8859-1", newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow(('Number','IPs Used in Network'))
-            writer.writerows(export_data)
+def csv_write():
+    with switchdb.DB() as swDB:
+        unique_list = swDB.getDeviceIPs()      #Duplicate IP entries are removed by the DB. Since "Sh ip arp" is run on all switches, they might have similar IP entries.
+    sorted_list = sorted(unique_list, key=lambda ip: struct.unpack("!L", inet_aton(ip))[0])  #Sort the IP address in Ascending Order
+    add_used_ips(enumerate(sorted_list, start=1))
+    #
+    #Below block of code will write the IP list to CSV file.
+    with open('consumed_ips.csv', 'w', encoding="ISO-8859-1", newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(('Number','IPs Used in Network'))
+        writer.writerows(enumerate(sorted_list, start=1))
 
 def run():
     """
@@ -291,34 +318,87 @@ def run():
     # Load all of our devices from config, then add to DB
     devicelist = loadDevices()
     addDeviceToDB(devicelist)
+    # In sharded mode only poll the devices this collector owns
+    if sharding.COLLECTOR_ID:
+        devicelist = sharding.claimDevices(devicelist)
+    # Skip devices that are backing off or not due for a poll yet
+    with switchdb.DB() as swDB:
+        healthlist = swDB.getAllDeviceHealth()
+    # Work out which devices are due before polling anything
+    duelist = {}
+    for device in devicelist:
+        ip = devicelist[device]['address']
+        devhealth = healthlist.get(ip, health.newHealth())
+        if not health.isDue(devhealth):
+            print(f"Skipping {device} ({ip}): {devhealth['state']}, "
+                  f"next poll at {time.ctime(devhealth['next_poll'])}")
+            continue
+        healthlist[ip] = devhealth
+        duelist[device] = devicelist[device]
+    # SNMP devices are cheap to poll - do them all concurrently up front
+    snmplist = {device: duelist[device] for device in duelist
+                if duelist[device].get('collector', 'ssh') == 'snmp'}
+    snmpresults = pollSNMP(snmplist)
     # Iterate through each device for processing
-    for iteration, device in enumerate(devicelist):
+    for device in duelist:
         dev = device
-        ip = devicelist[device]['address']
-        # Open device connection
-        devcon = connectToDevice(devicelist[device])
-        usedips(devcon)
-        iteration +=1
-        if devcon:
-            try:
-                # Query device for system & port info
-                if type(devcon) == IOSXEDriver:
-                    sysinfo = getSystemInfoXE(devcon)
-                if type(devcon) == NXOSDriver:
-                    sysinfo = getSystemInfoNX(devcon)
-                portinfo = getInterfaceInfo(devcon)
-            except Exception as e:
-                print(f'ERROR: {e}')
+        ip = duelist[device]['address']
+        devhealth = healthlist[ip]
+        if sharding.COLLECTOR_ID:
+            sharding.heartbeat()
+        if device in snmplist:
+            # Drop each result once saved, so walked tables are freed
+            result = snmpresults.pop(device)
+            if isinstance(result, Exception):
+                print(f'ERROR: {result}')
                 updateCheckStatus(device, ip, False)
+                updateHealth(ip, health.recordFailure(devhealth))
                 continue
-            # Update database with new info
+            sysinfo, intdata, arp = result
+            portinfo = summarizeInterfaces(intdata)
             updateDB(dev, ip, sysinfo, portinfo)
-            # Update if check succeeeded
             updateCheckStatus(dev, ip, True)
+            updateHealth(ip, health.recordSuccess(devhealth, portinfo))
+            try:
+                add_device_ips(ip, arp)
+            except Exception as e:
+                print(f'ERROR saving ARP entries of {device}: {e}')
+            continue
+        # Open device connection
+        devcon = connectToDevice(duelist[device])
+        if devcon:
+            try:
+                try:
+                    # Query device for system & port info
+                    if type(devcon) == IOSXEDriver:
+                        sysinfo = getSystemInfoXE(devcon)
+                    if type(devcon) == NXOSDriver:
+                        sysinfo = getSystemInfoNX(devcon)
+                    portinfo = getInterfaceInfo(devcon)
+                except Exception as e:
+                    print(f'ERROR: {e}')
+                    updateCheckStatus(device, ip, False)
+                    updateHealth(ip, health.recordFailure(devhealth))
+                    continue
+                # Update database with new info
+                updateDB(dev, ip, sysinfo, portinfo)
+                # Update if check succeeeded
+                updateCheckStatus(dev, ip, True)
+                updateHealth(ip, health.recordSuccess(devhealth, portinfo))
+                # ARP is collected last, so a failure here never marks a
+                # reachable switch as failed or trips its circuit breaker
+                try:
+                    usedips(devcon, ip)
+                except Exception as e:
+                    print(f'ERROR collecting ARP entries from {device}: {e}')
+            finally:
+                devcon.close()
         else:
             # Update DB if last check failed
             updateCheckStatus(device, ip, False)
-        csv_write(iteration, devicelist)
+            updateHealth(ip, health.recordFailure(devhealth))
+    csv_write()
+    pruneHistory()
    # Finally, update the last-run time!
     updateLastRun()
 
@@ -0,0 +1,142 @@
+"""Streaming CSV / gzip / Parquet exports of the switch database."""
+import argparse
+import csv
+import glob
+import gzip
+import hashlib
+import io
+import os
+import sys
+import tempfile
+
+import switchdb
+
+EXPORT_DIR = os.environ.get('SWITCH_EXPORT_DIR', 'exports')
+DATASETS = tuple(switchdb.EXPORT_QUERIES)
+FORMATS = {
+    'csv': 'text/csv',
+    'csv.gz': 'application/gzip',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def writeCSV(batches, fileobj):
+    """
+    Write header + row batches as CSV to a binary file object
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8', newline='',
+                            write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(next(batches))
+    for rows in batches:
+        writer.writerows(rows)
+    text.detach()
+
+
+def writeParquet(batches, fileobj):
+    """
+    Write header + row batches as Parquet, one row group per batch
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow")
+    columns = next(batches)
+    writer = None
+    for rows in batches:
+        table = pa.Table.from_arrays(
+            [pa.array(col) for col in zip(*rows)], names=columns)
+        if writer is None:
+            # Columns that are all NULL in the first batch default to text
+            schema = pa.schema([pa.field(field.name, pa.string())
+                                if pa.types.is_null(field.type) else field
+                                for field in table.schema])
+            writer = pq.ParquetWriter(fileobj, schema)
+        writer.write_table(table.cast(writer.schema))
+    if writer is None:
+        writer = pq.ParquetWriter(
+            fileobj, pa.schema([(name, pa.string()) for name in columns]))
+    writer.close()
+
+
+def writeExport(dataset, fmt, fileobj):
+    """
+    Stream one dataset from a DB cursor into fileobj
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    with switchdb.DB() as swDB:
+        batches = swDB.exportRows(dataset)
+        if fmt == 'csv':
+            writeCSV(batches, fileobj)
+        elif fmt == 'csv.gz':
+            with gzip.GzipFile(fileobj=fileobj, mode='wb') as gz:
+                writeCSV(batches, gz)
+        elif fmt == 'parquet':
+            writeParquet(batches, fileobj)
+
+
+def getGeneration():
+    """
+    Collector generation - changes every time data_collector runs
+    """
+    with switchdb.DB() as swDB:
+        lastupdate = swDB.getLastUpdate()
+    return hashlib.md5(str(lastupdate).encode()).hexdigest()[:12]
+
+
+def cachedExport(dataset, fmt):
+    """
+    Return the path of an export for the current collector generation,
+    building it (and removing older generations) if needed
+    """
+    generation = getGeneration()
+    path = os.path.join(EXPORT_DIR, f"{dataset}-{generation}.{fmt}")
+    if os.path.exists(path):
+        return path
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    # Each request builds into its own temp file; the finished export
+    # only appears under path once complete. If several requests race,
+    # the last os.replace wins with identical content
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f".{dataset}-",
+                               suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fileobj:
+            writeExport(dataset, fmt, fileobj)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    for old in glob.glob(os.path.join(EXPORT_DIR, f"{dataset}-*.{fmt}")):
+        if old != path:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                # Already removed by a concurrent request
+                pass
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export switch inventory, interface state, IPs & history")
+    parser.add_argument('dataset', choices=DATASETS)
+    parser.add_argument('-f', '--format', choices=FORMATS, default='csv')
+    parser.add_argument('-o', '--output', default='-',
+                        help="output file, '-' for stdout (default)")
+    args = parser.parse_args(argv)
+    if args.output == '-':
+        writeExport(args.dataset, args.format, sys.stdout.buffer)
+        sys.stdout.flush()
+    else:
+        with open(args.output, 'wb') as fileobj:
+            writeExport(args.dataset, args.format, fileobj)
+        print(f"Exported {args.dataset} to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,86 @@
 """Extract nested values from a JSON tree."""
+from collections import namedtuple
+
+# One ARP table entry from a Genie 'show ip arp' parse
+ArpRecord = namedtuple('ArpRecord', ['ip', 'mac', 'interface'])
+
+_END = object()
+
+
+def _items(obj):
+    """Iterate (key, value) pairs of a dict, or (None, item) for a list."""
+    if isinstance(obj, dict):
+        return iter(obj.items())
+    if isinstance(obj, list):
+        return ((None, item) for item in obj)
+    return iter(())
+
+
+def _select(obj, part):
+    """Iterate the children of obj matched by one key-path component."""
+    if isinstance(obj, dict):
+        if part == '*':
+            return iter(obj.values())
+        if part in obj:
+            return iter((obj[part],))
+    elif isinstance(obj, list):
+        if part == '*':
+            return iter(obj)
+        if part.isdigit() and int(part) < len(obj):
+            return iter((obj[int(part)],))
+    return None
+
+
+def iter_extract(obj, key):
+    """Lazily yield values of key from nested JSON, depth first.
+
+    Uses an explicit stack of iterators instead of recursion, so
+    arbitrarily deep trees are safe and no result list is built.
+    """
+    stack = [_items(obj)]
+    while stack:
+        for k, v in stack[-1]:
+            if isinstance(v, (dict, list)):
+                stack.append(_items(v))
+                break
+            if k == key:
+                yield v
+        else:
+            stack.pop()
+
+
+def iter_path(obj, path):
+    """Lazily yield values at a dotted key path.
+
+    '*' matches every key of a dict or every item of a list, e.g.
+    'interfaces.*.ipv4.neighbors.*.ip'. Numeric parts index lists.
+    """
+    parts = path.split('.') if isinstance(path, str) else list(path)
+    stack = [iter((obj,))]
+    while stack:
+        node = next(stack[-1], _END)
+        if node is _END:
+            stack.pop()
+            continue
+        depth = len(stack) - 1
+        if depth == len(parts):
+            yield node
+            continue
+        children = _select(node, parts[depth])
+        if children is not None:
+            stack.append(children)
+
+
+def iter_arp(parsed):
+    """Yield an ArpRecord for every neighbor in a Genie ARP parse."""
+    for ifname, iface in parsed.get('interfaces', {}).items():
+        neighbors = iface.get('ipv4', {}).get('neighbors', {})
+        for ip, entry in neighbors.items():
+            yield ArpRecord(entry.get('ip', ip),
+                            entry.get('link_layer_address'),
+                            entry.get('physical_interface', ifname))
 
 
 def json_extract(obj, key):
-    """Recursively fetch values from nested JSON."""
-    arr = []
-
-    def extract(obj, arr, key):
-        """Recursively search for values of key in JSON tree."""
-        if isinstance(obj, dict):
-            for k, v in obj.items():
-                if isinstance(v, (dict, list)):
-                    extract(v, arr, key)
-                elif k == key:
-                    arr.append(v)
-        elif isinstance(obj, list):
-            for item in obj:
-                extract(item, arr, key)
-        return arr
-
-    values = extract(obj, arr, key)
-    return values
\ No newline at end of file
+    """Fetch all values of key from nested JSON as a list."""
+    return list(iter_extract(obj, key))
@@ -0,0 +1,89 @@
+"""Per-device polling health: backoff, circuit breaker & adaptive intervals."""
+import os
+import time
+
+# Consecutive failures before the circuit opens
+FAILURE_THRESHOLD = int(os.environ.get('SWITCH_FAILURE_THRESHOLD', 3))
+# Backoff while the circuit is open doubles from BACKOFF_BASE up to BACKOFF_MAX
+BACKOFF_BASE = int(os.environ.get('SWITCH_BACKOFF_BASE', 900))
+BACKOFF_MAX = int(os.environ.get('SWITCH_BACKOFF_MAX', 86400))
+# Polling interval bounds (seconds) for healthy devices
+POLL_INTERVAL = int(os.environ.get('SWITCH_POLL_INTERVAL', 900))
+POLL_INTERVAL_MIN = int(os.environ.get('SWITCH_POLL_INTERVAL_MIN', 300))
+POLL_INTERVAL_MAX = int(os.environ.get('SWITCH_POLL_INTERVAL_MAX', 14400))
+# Port utilization (%) at which a switch counts as busy
+BUSY_UTILIZATION = 75
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+def newHealth():
+    """
+    Health record for a device that has never been polled
+    """
+    return {
+        'state': CLOSED,
+        'failures': 0,
+        'interval': POLL_INTERVAL,
+        'next_poll': 0,
+        'last_success': None,
+        'last_up_port': None
+    }
+
+
+def isDue(health, now=None):
+    """
+    Check whether a device should be polled this sweep.
+    An open circuit whose backoff has expired moves to half-open
+    and gets a single trial poll
+    """
+    now = time.time() if now is None else now
+    if health['next_poll'] > now:
+        return False
+    if health['state'] == OPEN:
+        health['state'] = HALF_OPEN
+    return True
+
+
+def recordFailure(health, now=None):
+    """
+    Count a failed poll. Once FAILURE_THRESHOLD is reached the
+    circuit opens and the device is skipped with exponential backoff
+    """
+    now = time.time() if now is None else now
+    health['failures'] += 1
+    if health['failures'] >= FAILURE_THRESHOLD:
+        health['state'] = OPEN
+        exponent = health['failures'] - FAILURE_THRESHOLD
+        backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** exponent)
+        health['next_poll'] = now + backoff
+    else:
+        # Retry on the next sweep
+        health['next_poll'] = now
+    return health
+
+
+def recordSuccess(health, portinfo, now=None):
+    """
+    Close the circuit and adapt the polling interval:
+    busy or changing switches are polled more often,
+    stable ones progressively less
+    """
+    now = time.time() if now is None else now
+    up = portinfo['up_port']
+    total = portinfo['total_port']
+    changed = health['last_up_port'] is not None and up != health['last_up_port']
+    busy = total > 0 and (up / total) * 100 >= BUSY_UTILIZATION
+    if changed or busy:
+        interval = max(POLL_INTERVAL_MIN, health['interval'] / 2)
+    else:
+        interval = min(POLL_INTERVAL_MAX, health['interval'] * 1.5)
+    health['state'] = CLOSED
+    health['failures'] = 0
+    health['interval'] = interval
+    health['next_poll'] = now + interval
+    health['last_success'] = now
+    health['last_up_port'] = up
+    return health
@@ -0,0 +1,164 @@
+"""Load & validate the device inventory."""
+import csv
+import ipaddress
+import os
+import re
+
+import yaml
+
+# Prefer the libyaml C parser when PyYAML was built with it
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+DEVICE_TYPES = ('ios-xe', 'nx-os')
+COLLECTORS = ('ssh', 'snmp')
+DEVICE_KEYS = ('type', 'address', 'username', 'password', 'port',
+               'collector', 'community', 'snmp_port', 'snmp_version')
+PORT_KEYS = ('port', 'snmp_port')
+SNMP_VERSIONS = ('2c',)
+HOSTNAME_LABEL = re.compile(r'[A-Za-z0-9-]{1,63}')
+
+class InventoryError(ValueError):
+    pass
+
+
+def _readYAML(path):
+    try:
+        with open(path, 'r') as config:
+            data = yaml.load(config, Loader=SafeLoader) or {}
+    except yaml.YAMLError as e:
+        raise InventoryError(f"{path}: invalid YAML: {e}")
+    if not isinstance(data, dict):
+        raise InventoryError(f"{path}: expected a mapping at top level")
+    return data
+
+
+def _readCSV(path):
+    """
+    One device per row. 'name' column is the device name,
+    the other columns are device keys. Empty cells are skipped
+    """
+    devices = {}
+    with open(path, 'r', newline='') as source:
+        for line, row in enumerate(csv.DictReader(source), start=2):
+            name = (row.pop('name', None) or '').strip()
+            if not name:
+                raise InventoryError(f"{path}:{line}: missing device name")
+            if name in devices:
+                raise InventoryError(f"{path}:{line}: duplicate device {name}")
+            devices[name] = {key: value.strip() for key, value in row.items()
+                             if key and value and value.strip()}
+    return devices
+
+
+def _readSource(path, devices, sources, seen):
+    """
+    Read one YAML or CSV source into devices, following Include entries.
+    Every file read is added to sources
+    """
+    path = os.path.abspath(path)
+    if path in seen:
+        raise InventoryError(f"{path}: circular include")
+    seen = seen | {path}
+    if not os.path.isfile(path):
+        raise InventoryError(f"{path}: inventory file not found")
+    sources.append(path)
+    if path.endswith('.csv'):
+        found, includes = _readCSV(path), []
+    else:
+        data = _readYAML(path)
+        found = data.get('Devices') or {}
+        includes = data.get('Include') or []
+        if isinstance(includes, str):
+            includes = [includes]
+        if not isinstance(found, dict):
+            raise InventoryError(f"{path}: 'Devices' must be a mapping "
+                                 f"of device name to settings")
+        if not isinstance(includes, list) or not all(
+                isinstance(include, str) for include in includes):
+            raise InventoryError(f"{path}: 'Include' must be a file name "
+                                 f"or a list of file names")
+    for name, device in found.items():
+        name = str(name)
+        if name in devices:
+            raise InventoryError(f"{path}: device {name} is defined twice")
+        devices[name] = device
+    for include in includes:
+        include = os.path.join(os.path.dirname(path), include)
+        _readSource(include, devices, sources, seen)
+
+
+def _isHostname(address):
+    """
+    Check a DNS name label by label. A single regex over the whole
+    name backtracks exponentially on names with an invalid character
+    """
+    if not 0 < len(address) <= 253:
+        return False
+    return all(HOSTNAME_LABEL.fullmatch(label)
+               for label in address.rstrip('.').split('.'))
+
+
+def validate(devices):
+    """
+    Check every device entry, normalize types & raise
+    an InventoryError listing all problems found
+    """
+    errors = []
+    addresses = {}
+    for name, device in devices.items():
+        if not isinstance(device, dict):
+            errors.append(f"{name}: expected a mapping of device settings")
+            continue
+        for key in device:
+            if key not in DEVICE_KEYS:
+                errors.append(f"{name}: unknown key '{key}'")
+        device.setdefault('collector', 'ssh')
+        if device.get('type') not in DEVICE_TYPES:
+            errors.append(f"{name}: type must be one of {', '.join(DEVICE_TYPES)}")
+        if device['collector'] not in COLLECTORS:
+            errors.append(f"{name}: collector must be one of {', '.join(COLLECTORS)}")
+        elif device['collector'] == 'ssh':
+            for key in ('username', 'password'):
+                if not device.get(key):
+                    errors.append(f"{name}: '{key}' is required for SSH")
+        address = str(device.get('address') or '')
+        try:
+            address = str(ipaddress.ip_address(address))
+        except ValueError:
+            # Dotted numbers that are not a valid IP are a typo, not a name
+            if not _isHostname(address) or re.match(r'^[\d.]+$', address):
+                errors.append(f"{name}: invalid address '{address}'")
+        device['address'] = address
+        if address in addresses:
+            errors.append(f"{name}: address {address} already used by "
+                          f"{addresses[address]}")
+        addresses[address] = name
+        for key in PORT_KEYS:
+            if key not in device:
+                continue
+            try:
+                device[key] = int(device[key])
+                if not 0 < device[key] < 65536:
+                    raise ValueError
+            except (TypeError, ValueError):
+                errors.append(f"{name}: invalid {key} '{device[key]}'")
+        if 'snmp_version' in device:
+            device['snmp_version'] = str(device['snmp_version'])
+            if device['snmp_version'] not in SNMP_VERSIONS:
+                errors.append(f"{name}: snmp_version must be one of "
+                              f"{', '.join(SNMP_VERSIONS)}")
+    if errors:
+        raise InventoryError("Invalid inventory:\n  " + "\n  ".join(errors))
+    return devices
+
+
+def loadInventory(path='config.yml'):
+    """
+    Return validated {name: device} for config.yml and its includes
+    """
+    devices = {}
+    sources = []
+    _readSource(path, devices, sources, frozenset())
+    validate(devices)
+    print(f"Loaded {len(devices)} devices from {len(sources)} inventory files")
+    return devices
@@ -0,0 +1,93 @@
+"""Split the device inventory between several collectors."""
+import bisect
+import hashlib
+import os
+import socket
+import time
+
+import switchdb
+
+# Set SWITCH_COLLECTOR_ID on each collector host to enable sharded polling
+COLLECTOR_ID = os.environ.get('SWITCH_COLLECTOR_ID')
+# Collectors without a heartbeat for this many seconds are considered dead
+COLLECTOR_TTL = int(os.environ.get('SWITCH_COLLECTOR_TTL', 900))
+# Seconds a newly joining collector waits for the heartbeats of
+# collectors starting at the same time before splitting the inventory
+COLLECTOR_SETTLE = int(os.environ.get('SWITCH_COLLECTOR_SETTLE', 30))
+# Virtual nodes per collector on the hash ring
+REPLICAS = 64
+
+
+def _hash(key):
+    """
+    Stable 64-bit hash, identical on every collector host
+    """
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping device addresses to collectors.
+    Adding or removing a collector only moves the devices
+    that hashed to that collector's virtual nodes
+    """
+
+    def __init__(self, nodes, replicas=REPLICAS):
+        self.ring = sorted((_hash(f"{node}#{i}"), node)
+                           for node in nodes
+                           for i in range(replicas))
+        self.keys = [key for key, node in self.ring]
+
+    def owner(self, key):
+        """
+        Return the collector responsible for key
+        """
+        if not self.ring:
+            return None
+        idx = bisect.bisect(self.keys, _hash(key)) % len(self.keys)
+        return self.ring[idx][1]
+
+
+def heartbeat(collector_id=COLLECTOR_ID):
+    """
+    Call to DB - record that this collector is alive
+    """
+    with switchdb.DB() as swDB:
+        swDB.heartbeat(collector_id, socket.gethostname())
+
+
+def activeCollectors(collector_id=COLLECTOR_ID, ttl=COLLECTOR_TTL):
+    """
+    Return the live collectors, always including this one
+    """
+    with switchdb.DB() as swDB:
+        collectors = swDB.getActiveCollectors(ttl)
+    if collector_id not in collectors:
+        collectors.append(collector_id)
+    return collectors
+
+
+def claimDevices(devicelist, collector_id=COLLECTOR_ID,
+                 settle=COLLECTOR_SETTLE):
+    """
+    Heartbeat, then return the subset of devicelist
+    owned by this collector. Devices of collectors whose
+    heartbeat expired are picked up by the survivors.
+    A collector that was not active yet waits settle seconds first,
+    so collectors started together all see each other in the ring
+    """
+    with switchdb.DB() as swDB:
+        joining = collector_id not in swDB.getActiveCollectors(COLLECTOR_TTL)
+    heartbeat(collector_id)
+    if joining and settle > 0:
+        print(f"Collector {collector_id} is joining, waiting {settle}s "
+              f"for other collectors to register")
+        time.sleep(settle)
+    collectors = activeCollectors(collector_id)
+    ring = HashRing(collectors)
+    owned = {name: dev for name, dev in devicelist.items()
+             if ring.owner(str(dev['address'])) == collector_id}
+    print(f"Collector {collector_id} owns {len(owned)} of "
+          f"{len(devicelist)} devices ({len(collectors)} active collectors)")
+    return owned
+
@@ -0,0 +1,186 @@
+"""Lightweight SNMP polling path (GETBULK on IF-MIB) alongside SSH + Genie."""
+import asyncio
+import os
+
+from pysnmp.hlapi.v3arch.asyncio import (CommunityData, ContextData,
+                                         ObjectIdentity, ObjectType,
+                                         SnmpEngine, UdpTransportTarget,
+                                         bulk_cmd)
+from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchInstance, NoSuchObject
+
+from extract import ArpRecord
+
+# Devices polled at the same time
+SNMP_CONCURRENCY = int(os.environ.get('SWITCH_SNMP_CONCURRENCY', 50))
+# Rows requested per GETBULK
+MAX_REPETITIONS = 50
+SNMP_TIMEOUT = 5
+SNMP_RETRIES = 1
+# pysnmp message processing model per snmp_version.
+# SNMPv1 has no GETBULK, so it is not supported
+MP_MODELS = {'2c': 1}
+
+# IF-MIB
+IF_DESCR = '1.3.6.1.2.1.2.2.1.2'
+IF_ADMIN_STATUS = '1.3.6.1.2.1.2.2.1.7'
+IF_OPER_STATUS = '1.3.6.1.2.1.2.2.1.8'
+IF_HIGH_SPEED = '1.3.6.1.2.1.31.1.1.1.15'
+# ENTITY-MIB
+ENT_PHYSICAL_CLASS = '1.3.6.1.2.1.47.1.1.1.1.5'
+ENT_PHYSICAL_SOFTWARE_REV = '1.3.6.1.2.1.47.1.1.1.1.10'
+ENT_PHYSICAL_SERIAL_NUM = '1.3.6.1.2.1.47.1.1.1.1.11'
+ENT_PHYSICAL_MODEL_NAME = '1.3.6.1.2.1.47.1.1.1.1.13'
+ENT_CLASS_CHASSIS = 3
+# IP-MIB ipNetToMediaPhysAddress, indexed by ifIndex.IP
+IP_NET_TO_MEDIA_PHYS_ADDRESS = '1.3.6.1.2.1.4.22.1.2'
+
+
+class SNMPError(Exception):
+    pass
+
+
+async def bulkWalk(engine, auth, target, columns):
+    """
+    Walk several table columns side by side with GETBULK.
+    Returns {column: {index: value}}, index being the OID
+    suffix after the column as a string
+    """
+    results = {column: {} for column in columns}
+    position = {column: column for column in columns}
+    active = list(columns)
+    while active:
+        errorIndication, errorStatus, errorIndex, varBinds = await bulk_cmd(
+            engine, auth, target, ContextData(), 0, MAX_REPETITIONS,
+            *[ObjectType(ObjectIdentity(position[column])) for column in active])
+        if errorIndication:
+            raise SNMPError(str(errorIndication))
+        if errorStatus:
+            raise SNMPError(errorStatus.prettyPrint())
+        done = set()
+        # Response rows repeat the requested columns in order
+        for i, (oid, value) in enumerate(varBinds):
+            column = active[i % len(active)]
+            if column in done:
+                continue
+            oid = str(oid)
+            if not oid.startswith(column + '.') or isinstance(
+                    value, (EndOfMibView, NoSuchInstance, NoSuchObject)):
+                done.add(column)
+                continue
+            results[column][oid[len(column) + 1:]] = value
+            position[column] = oid
+        active = [column for column in active if column not in done]
+    return results
+
+
+def _mac(value):
+    """
+    Format a PhysAddress as Cisco dotted hex (aabb.ccdd.eeff)
+    """
+    raw = bytes(value).hex()
+    return '.'.join(raw[i:i + 4] for i in range(0, len(raw), 4))
+
+
+def mapInterfaces(table):
+    """
+    Map IF-MIB columns into the Genie 'show interfaces' layout
+    consumed by data_collector.summarizeInterfaces().
+    IF-MIB carries no media type, so 'media_type' is omitted
+    """
+    intdata = {}
+    for index, descr in table[IF_DESCR].items():
+        speed = table[IF_HIGH_SPEED].get(index)
+        intdata[str(descr)] = {
+            'enabled': int(table[IF_ADMIN_STATUS].get(index, 2)) == 1,
+            'oper_status': 'up' if int(table[IF_OPER_STATUS].get(index, 2)) == 1
+            else 'down',
+            # ifHighSpeed is Mbit/s, Genie bandwidth is Kbit/s
+            'bandwidth': int(speed) * 1000 if speed is not None else 0,
+        }
+    return intdata
+
+
+def mapSystemInfo(table):
+    """
+    Serial, model & software version of the chassis entity
+    """
+    classes = table[ENT_PHYSICAL_CLASS]
+    chassis = [index for index, cls in classes.items()
+               if int(cls) == ENT_CLASS_CHASSIS]
+    index = chassis[0] if chassis else next(iter(classes), None)
+    if index is None:
+        raise SNMPError("No ENTITY-MIB chassis found")
+    sw_ver = str(table[ENT_PHYSICAL_SOFTWARE_REV].get(index, ''))
+    if not sw_ver:
+        # Software revision is often only set on a module entity
+        sw_ver = next((str(rev) for rev in
+                       table[ENT_PHYSICAL_SOFTWARE_REV].values() if str(rev)),
+                      'N/A')
+    sysinfo = {}
+    sysinfo['serial'] = str(table[ENT_PHYSICAL_SERIAL_NUM].get(index, ''))
+    sysinfo['model'] = str(table[ENT_PHYSICAL_MODEL_NAME].get(index, 'N/A'))
+    sysinfo['sw_ver'] = sw_ver
+    return sysinfo
+
+
+def mapArp(table, ifnames):
+    """
+    Yield ArpRecords from ipNetToMediaPhysAddress
+    """
+    for index, mac in table[IP_NET_TO_MEDIA_PHYS_ADDRESS].items():
+        ifindex, ip = index.split('.', 1)
+        yield ArpRecord(ip, _mac(mac), ifnames.get(ifindex, ifindex))
+
+
+async def pollDevice(engine, deviceconfig):
+    """
+    Poll one device over SNMP.
+    Returns (sysinfo, intdata, arp records). The ARP records are
+    a generator over the walked table, mapped only as they are saved
+    """
+    version = str(deviceconfig.get('snmp_version', '2c'))
+    if version not in MP_MODELS:
+        raise SNMPError(f"Unsupported snmp_version: {version}")
+    auth = CommunityData(deviceconfig.get('community', 'public'),
+                         mpModel=MP_MODELS[version])
+    target = await UdpTransportTarget.create(
+        (deviceconfig['address'], int(deviceconfig.get('snmp_port', 161))),
+        timeout=SNMP_TIMEOUT, retries=SNMP_RETRIES)
+    iftable = await bulkWalk(engine, auth, target,
+                             (IF_DESCR, IF_ADMIN_STATUS,
+                              IF_OPER_STATUS, IF_HIGH_SPEED))
+    enttable = await bulkWalk(engine, auth, target,
+                              (ENT_PHYSICAL_CLASS, ENT_PHYSICAL_SOFTWARE_REV,
+                               ENT_PHYSICAL_SERIAL_NUM, ENT_PHYSICAL_MODEL_NAME))
+    arptable = await bulkWalk(engine, auth, target,
+                              (IP_NET_TO_MEDIA_PHYS_ADDRESS,))
+    ifnames = {index: str(descr) for index, descr in iftable[IF_DESCR].items()}
+    return (mapSystemInfo(enttable),
+            mapInterfaces(iftable),
+            mapArp(arptable, ifnames))
+
+
+async def _pollAll(devicelist):
+    engine = SnmpEngine()
+    limit = asyncio.Semaphore(SNMP_CONCURRENCY)
+
+    async def poll(name):
+        async with limit:
+            print(f"Polling {name} ({devicelist[name]['address']}) over SNMP")
+            return await pollDevice(engine, devicelist[name])
+
+    names = list(devicelist)
+    results = await asyncio.gather(*(poll(name) for name in names),
+                                   return_exceptions=True)
+    engine.close_dispatcher()
+    return dict(zip(names, results))
+
+
+def pollDevices(devicelist):
+    """
+    Poll all devices concurrently. Returns {device: result},
+    where result is (sysinfo, intdata, arp records) or the Exception raised
+    """
+    if not devicelist:
+        return {}
+    return asyncio.run(_pollAll(devicelist))
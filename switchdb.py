@@ -1,87 +1,233 @@
+import abc
+import io
+import os
+import csv
+import time
 import sqlite3
 from datetime import datetime
 from pytz import reference
 from sqlite3 import Error
 
 
-class DB:
+# Storage backend selection. SQLite is the default, PostgreSQL (optionally
+# with TimescaleDB) is used when SWITCHDB_BACKEND=postgres.
+DB_BACKEND = os.environ.get('SWITCHDB_BACKEND', 'sqlite')
+DB_PATH = os.environ.get('SWITCHDB_PATH', './sw-util.db')
+DB_DSN = os.environ.get('SWITCHDB_DSN', 'dbname=switchdb')
+DB_POOL_MIN = int(os.environ.get('SWITCHDB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('SWITCHDB_POOL_MAX', 10))
+# Rows buffered per COPY round-trip during PostgreSQL bulk inserts
+COPY_BATCH = 10_000
+# Rows fetched per round-trip when streaming exports
+EXPORT_BATCH = 5_000
+# Days of port history kept; older samples are pruned by the collector
+HISTORY_DAYS = int(os.environ.get('SWITCHDB_HISTORY_DAYS', 90))
+
+# Tables holding per-switch rows, keyed by mgmt_ip
+SWITCH_TABLES = ('switches', 'device_health', 'device_ips',
+                 'port_history', 'interfaces')
+
+# Queries behind each exportable dataset
+EXPORT_QUERIES = {
+    'switches': """ SELECT * FROM switches ORDER BY mgmt_ip; """,
+    'interfaces': """ SELECT * FROM interfaces ORDER BY mgmt_ip, name; """,
+    'ips': """ SELECT id, IP_ADDRESS FROM IPs_USED ORDER BY id; """,
+    'arp': """ SELECT mgmt_ip, IP_ADDRESS, mac_address, interface
+                 FROM device_ips ORDER BY mgmt_ip; """,
+    'history': """ SELECT mgmt_ip, ts, total_port, up_port
+                     FROM port_history ORDER BY ts; """,
+}
+
+
+def DB():
+    """
+    Open a connection to the configured storage backend
+    """
+    if DB_BACKEND in ('postgres', 'postgresql', 'timescale'):
+        return PostgresDB(DB_DSN)
+    if DB_BACKEND == 'sqlite':
+        return SQLiteDB(DB_PATH)
+    raise ValueError(f"Unknown SWITCHDB_BACKEND: {DB_BACKEND}")
+
+
+class BaseDB(abc.ABC):
+    """
+    Queries shared by every storage backend.
+    SQL is written with '?' placeholders and translated
+    to the backend's paramstyle by _q(). Backends must
+    implement every abstract method below
+    """
+    paramstyle = '?'
+    IntegrityError = sqlite3.IntegrityError
+
     def __init__(self):
-        self.openDB()
-        self.createDB()
-        self.initLastUpdate()
+        self.conn = None
+        try:
+            self.openDB()
+            self.createDB()
+            self.initLastUpdate()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
+    def _q(self, sql):
+        """
+        Translate '?' placeholders to the backend paramstyle
+        """
+        if self.paramstyle == '?':
+            return sql
+        return sql.replace('?', self.paramstyle)
+
+    @abc.abstractmethod
     def openDB(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def createDB(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def add_used_ip(self, id, IP_ADDRESS):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def update_used_ip(self, id, IP_ADDRESS):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _bulkInsert(self, cur, table, columns, rows):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _bulkInsertMissing(self, cur, table, columns, rows):
+        raise NotImplementedError
+
+    def replaceUsedIPs(self, rows):
         """
-        Open SQLlite DB
+        Replace the full consumed IP list in a single transaction.
+        rows is an iterable of (id, IP_ADDRESS) tuples.
+        Collectors rebuilding the list at the same time take turns
         """
-        self.conn = None
+        cur = self.conn.cursor()
         try:
-            self.conn = sqlite3.connect('./sw-util.db')
-        except Error as e:
-            print(e)
+            self._lockTable(cur, 'IPs_USED')
+            cur.execute(""" DELETE FROM IPs_USED; """)
+            self._bulkInsert(cur, 'IPs_USED', ('id', 'IP_ADDRESS'), rows)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        print("Replaced consumed IPs in the database")
+        return
 
-    def createDB(self):
+    def heartbeat(self, collector_id, hostname):
         """
-        Create new table to contain switch info & port utilization data
+        Record that a collector is alive
         """
-        sw_info_table = """ CREATE TABLE IF NOT EXISTS switches (
-            name text NOT NULL,
-            serial text DEFAULT "Not Polled Yet",
-            model text DEFAULT "N/A",
-            sw_ver text DEFAULT "N/A",
-            mgmt_ip text NOT NULL PRIMARY KEY,
-            last_check boolean DEFAULT False,
-            total_port integer DEFAULT 0,
-            up_port integer DEFAULT 0,
-            down_port integer DEFAULT 0,
-            disabled_port integer DEFAULT 0,
-            intop10m integer DEFAULT 0,
-            intop100m integer DEFAULT 0,
-            intop1g integer DEFAULT 0,
-            intop10g integer DEFAULT 0,
-            intop25g integer DEFAULT 0,
-            intop40g integer DEFAULT 0,
-            intop100g integer DEFAULT 0,
-            intmedcop integer DEFAULT 0,
-            intmedsfp integer DEFAULT 0,
-            intmedvirt integer DEFAULT 0
-        ); """
-        CONSUMED_IPs_TABLE = """ CREATE TABLE IF NOT EXISTS IPs_USED (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            IP_ADDRESS INTEGER DEFAULT 1
-            );
-            """
+        sql = """ INSERT INTO collectors(collector_id, hostname, last_heartbeat)
+                  values(?,?,?)
+                  ON CONFLICT(collector_id) DO UPDATE
+                  SET hostname = excluded.hostname,
+                  last_heartbeat = excluded.last_heartbeat; """
+        cur = self.conn.cursor()
+        cur.execute(self._q(sql), (collector_id, hostname, time.time()))
+        self.conn.commit()
+        return
 
-        last_update_table = """ CREATE TABLE IF NOT EXISTS last_update (
-            id integer NOT NULL PRIMARY KEY,
-            lastrun text NOT NULL
-        ); """
+    def getActiveCollectors(self, ttl):
+        """
+        Return IDs of collectors that sent a heartbeat
+        within the last ttl seconds
+        """
+        sql = """ SELECT collector_id FROM collectors
+                  WHERE last_heartbeat >= ?
+                  ORDER BY collector_id; """
         cur = self.conn.cursor()
-        cur.execute(sw_info_table)
-        cur.execute(CONSUMED_IPs_TABLE)
-        cur.execute(last_update_table)
+        cur.execute(self._q(sql), [time.time() - ttl])
+        result = [row[0] for row in cur.fetchall()]
+        return result
 
-    def add_used_ip(self,id, IP_ADDRESS):
+    def replaceDeviceIPs(self, mgmt_ip, records):
         """
-        Insert USED IP Addressese into DB
+        Replace the ARP-learned IPs of one switch in a single transaction.
+        records is an iterable of (ip, mac, interface) tuples and is
+        consumed lazily, so ARP tables are never held as a list
         """
-        sql = """ INSERT OR IGNORE INTO IPs_USED(id,IP_ADDRESS) values(?,?);"""
         cur = self.conn.cursor()
-        cur.execute(sql,(id,IP_ADDRESS))
-        self.conn.commit()
-        print("Adding Consumed IPs to the database")
+        try:
+            cur.execute(self._q(""" DELETE FROM device_ips
+                                    WHERE mgmt_ip = ?; """),
+                        [mgmt_ip])
+            self._bulkInsert(cur, 'device_ips',
+                             ('mgmt_ip', 'IP_ADDRESS', 'mac_address', 'interface'),
+                             ((mgmt_ip,) + tuple(record) for record in records))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
         return
 
-    def update_used_ip(self,id,IP_ADDRESS):
+    def getDeviceIPs(self):
         """
-        UPDATE IP USED Information
+        Return the de-duplicated IPs learned from all
+        switches currently in the DB
         """
-        sql = """ UPDATE OR REPLACE IPs_USED SET 
-                  id = ?,
-                  IP_ADDRESS = ?;
+        sql = """ SELECT DISTINCT IP_ADDRESS FROM device_ips
+                  WHERE mgmt_ip IN (SELECT mgmt_ip FROM switches); """
+        cur = self.conn.cursor()
+        cur.execute(sql)
+        result = [row[0] for row in cur.fetchall()]
+        return result
+
+    def getAllDeviceHealth(self):
+        """
+        Retrieve polling health for all devices,
+        keyed by management IP
         """
+        sql = """ SELECT mgmt_ip, state, failures, poll_interval, next_poll,
+                  last_success, last_up_port FROM device_health; """
         cur = self.conn.cursor()
-        cur.execute(sql,(id,IP_ADDRESS))
+        cur.execute(sql)
+        result = {}
+        for row in cur.fetchall():
+            result[row[0]] = {
+                'state': row[1],
+                'failures': row[2],
+                'interval': row[3],
+                'next_poll': row[4],
+                'last_success': row[5],
+                'last_up_port': row[6]
+            }
+        return result
+
+    def updateDeviceHealth(self, mgmt_ip, health):
+        """
+        Insert or update polling health for one device
+        """
+        sql = """ INSERT INTO device_health(mgmt_ip, state, failures,
+                  poll_interval, next_poll, last_success, last_up_port)
+                  values(?,?,?,?,?,?,?)
+                  ON CONFLICT(mgmt_ip) DO UPDATE
+                  SET state = excluded.state,
+                  failures = excluded.failures,
+                  poll_interval = excluded.poll_interval,
+                  next_poll = excluded.next_poll,
+                  last_success = excluded.last_success,
+                  last_up_port = excluded.last_up_port; """
+        cur = self.conn.cursor()
+        cur.execute(self._q(sql), (mgmt_ip,
+                                   health['state'],
+                                   health['failures'],
+                                   health['interval'],
+                                   health['next_poll'],
+                                   health['last_success'],
+                                   health['last_up_port']))
         self.conn.commit()
         return
 
@@ -89,7 +235,7 @@ class DB:
         """
         Retrieve Used IP information
         """
-        sql = """ SELECT id, IP_ADDRESS FROM IPs_USED; """
+        sql = """ SELECT id, IP_ADDRESS FROM IPs_USED ORDER BY id; """
         cur = self.conn.cursor()
         cur.execute(sql)
         result = cur.fetchall()
@@ -102,9 +248,10 @@ class DB:
         sql = """ INSERT INTO switches(name,mgmt_ip) values(?,?); """
         cur = self.conn.cursor()
         try:
-            cur.execute(sql, (name, mgmt_ip))
+            cur.execute(self._q(sql), (name, mgmt_ip))
             self.conn.commit()
-        except sqlite3.IntegrityError:
+        except self.IntegrityError:
+            self.conn.rollback()
             print(f"Switch {name} with IP: {mgmt_ip} already exists in DB.")
 
     def updateSysInfo(self, name, mgmt_ip, sysinfo):
@@ -120,10 +267,10 @@ class DB:
                   AND mgmt_ip = ?;
         """
         cur = self.conn.cursor()
-        cur.execute(sql, (sysinfo['serial'],
-                          sysinfo['model'],
-                          sysinfo['sw_ver'],
-                          name, mgmt_ip))
+        cur.execute(self._q(sql), (sysinfo['serial'],
+                                   sysinfo['model'],
+                                   sysinfo['sw_ver'],
+                                   name, mgmt_ip))
         self.conn.commit()
         return
 
@@ -151,24 +298,133 @@ class DB:
                   AND mgmt_ip = ?;
         """
         cur = self.conn.cursor()
-        cur.execute(sql, (portinfo['total_port'],
-                          portinfo['up_port'],
-                          portinfo['down_port'],
-                          portinfo['disabled_port'],
-                          portinfo['intop10m'],
-                          portinfo['intop100m'],
-                          portinfo['intop1g'],
-                          portinfo['intop10g'],
-                          portinfo['intop25g'],
-                          portinfo['intop40g'],
-                          portinfo['intop100g'],
-                          portinfo['intmedcop'],
-                          portinfo['intmedsfp'],
-                          portinfo['intmedvirtual'],
-                          name, mgmt_ip))
+        cur.execute(self._q(sql), (portinfo['total_port'],
+                                   portinfo['up_port'],
+                                   portinfo['down_port'],
+                                   portinfo['disabled_port'],
+                                   portinfo['intop10m'],
+                                   portinfo['intop100m'],
+                                   portinfo['intop1g'],
+                                   portinfo['intop10g'],
+                                   portinfo['intop25g'],
+                                   portinfo['intop40g'],
+                                   portinfo['intop100g'],
+                                   portinfo['intmedcop'],
+                                   portinfo['intmedsfp'],
+                                   portinfo['intmedvirtual'],
+                                   name, mgmt_ip))
         self.conn.commit()
         return
 
+    def addPortHistory(self, mgmt_ip, portinfo):
+        """
+        Record a port count sample for capacity trending
+        """
+        sql = """ INSERT INTO port_history(mgmt_ip, ts, total_port, up_port)
+                  values(?,?,?,?); """
+        cur = self.conn.cursor()
+        cur.execute(self._q(sql), (mgmt_ip, int(time.time()),
+                                   portinfo['total_port'],
+                                   portinfo['up_port']))
+        self.conn.commit()
+        return
+
+    def getPortHistory(self, since):
+        """
+        Retrieve port count samples taken after since (epoch seconds)
+        """
+        sql = """ SELECT mgmt_ip, ts, total_port, up_port FROM port_history
+                  WHERE ts >= ?; """
+        cur = self.conn.cursor()
+        cur.execute(self._q(sql), [int(since)])
+        result = cur.fetchall()
+        return result
+
+    def getHistorySums(self, since):
+        """
+        Per-switch least-squares sums over port count samples taken
+        after since (epoch seconds), aggregated in the database.
+        t is days since since. Returns rows of
+        (mgmt_ip, count, sum t, sum up, sum t*t, sum t*up)
+        """
+        sql = """ SELECT mgmt_ip, COUNT(*), SUM(t), SUM(up),
+                  SUM(t * t), SUM(t * up)
+                  FROM (SELECT mgmt_ip,
+                        CAST(ts - ? AS double precision) / 86400 AS t,
+                        CAST(up_port AS double precision) AS up
+                        FROM port_history WHERE ts >= ?) AS samples
+                  GROUP BY mgmt_ip; """
+        cur = self.conn.cursor()
+        cur.execute(self._q(sql), [int(since), int(since)])
+        result = cur.fetchall()
+        return result
+
+    def prunePortHistory(self, before):
+        """
+        Delete port count samples taken before before (epoch seconds).
+        Returns the number of samples deleted
+        """
+        sql = """ DELETE FROM port_history WHERE ts < ?; """
+        cur = self.conn.cursor()
+        cur.execute(self._q(sql), [int(before)])
+        self.conn.commit()
+        return cur.rowcount
+
+    def getCapacityStats(self):
+        """
+        Retrieve per-switch data used for fleet capacity analytics
+        """
+        sql = """ SELECT name, mgmt_ip, model, sw_ver, total_port, up_port
+                  FROM switches; """
+        cur = self.conn.cursor()
+        cur.execute(sql)
+        result = cur.fetchall()
+        return result
+
+    def replaceInterfaces(self, mgmt_ip, interfaces):
+        """
+        Replace per-interface state of one switch in a single transaction.
+        interfaces is an iterable of
+        (name, enabled, oper_status, bandwidth, media_type) tuples
+        """
+        cur = self.conn.cursor()
+        try:
+            cur.execute(self._q(""" DELETE FROM interfaces
+                                    WHERE mgmt_ip = ?; """), [mgmt_ip])
+            self._bulkInsert(cur, 'interfaces',
+                             ('mgmt_ip', 'name', 'enabled', 'oper_status',
+                              'bandwidth', 'media_type'),
+                             ((mgmt_ip,) + tuple(iface) for iface in interfaces))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return
+
+    def _lockTable(self, cur, table):
+        """
+        Block other writers of table until this transaction ends.
+        SQLite only ever allows one writer, so nothing is needed
+        """
+        return
+
+    def _streamCursor(self):
+        return self.conn.cursor()
+
+    def exportRows(self, dataset, batch=EXPORT_BATCH):
+        """
+        Stream an export dataset: yields the column names,
+        then lists of at most batch rows
+        """
+        cur = self._streamCursor()
+        cur.execute(EXPORT_QUERIES[dataset])
+        rows = cur.fetchmany(batch)
+        yield [col[0] for col in cur.description]
+        while rows:
+            yield rows
+            rows = cur.fetchmany(batch)
+        cur.close()
+
     def getSwitch(self, name, mgmt_ip):
         """
         Retrieve switch information
@@ -176,20 +432,49 @@ class DB:
         sql = """ SELECT * FROM switches
                   WHERE name = ? AND mgmt_ip = ?; """
         cur = self.conn.cursor()
-        cur.execute(sql, (name, mgmt_ip))
+        cur.execute(self._q(sql), (name, mgmt_ip))
         result = cur.fetchall()
         return result
 
+    def _deleteSwitches(self, cur, mgmt_ips):
+        """
+        Delete switches and everything recorded about them
+        """
+        params = [[mgmt_ip] for mgmt_ip in mgmt_ips]
+        for table in SWITCH_TABLES:
+            cur.executemany(self._q(f""" DELETE FROM {table}
+                                         WHERE mgmt_ip = ?; """), params)
+
     def deleteSwitch(self, mgmt_ip):
         """
         Remove switch from database
         """
-        sql = """ DELETE FROM switches
-                  WHERE mgmt_ip = ?; """
         cur = self.conn.cursor()
-        cur.execute(sql, [mgmt_ip])
-        result = cur.fetchall()
-        return result
+        self._deleteSwitches(cur, [mgmt_ip])
+        self.conn.commit()
+        return
+
+    def syncSwitches(self, switches):
+        """
+        Make the switches table match the inventory in one transaction.
+        switches is a dict of {mgmt_ip: name}.
+        Returns the lists of added & removed management IPs
+        """
+        cur = self.conn.cursor()
+        try:
+            cur.execute(""" SELECT mgmt_ip FROM switches; """)
+            current = {row[0] for row in cur.fetchall()}
+            removed = sorted(current.difference(switches))
+            added = [mgmt_ip for mgmt_ip in switches if mgmt_ip not in current]
+            self._deleteSwitches(cur, removed)
+            # Another collector may add the same switches concurrently
+            self._bulkInsertMissing(cur, 'switches', ('name', 'mgmt_ip'),
+                             ((switches[mgmt_ip], mgmt_ip) for mgmt_ip in added))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return added, removed
 
     def getNetworkWideStats(self):
         """
@@ -222,7 +507,7 @@ class DB:
         """
         sql = """ SELECT * FROM switches WHERE serial = ?; """
         cur = self.conn.cursor()
-        cur.execute(sql, [serial])
+        cur.execute(self._q(sql), [serial])
         result = cur.fetchall()
         return result
 
@@ -234,7 +519,7 @@ class DB:
         sql = """ UPDATE switches SET last_check = ?
                   WHERE name = ? AND mgmt_ip = ?; """
         cur = self.conn.cursor()
-        cur.execute(sql, (status, name, mgmt_ip))
+        cur.execute(self._q(sql), (status, name, mgmt_ip))
         self.conn.commit()
         print("DB Update completed")
         return
@@ -250,7 +535,7 @@ class DB:
         now = datetime.now()
         timestamp = now.strftime("%B, %d, %Y %H:%M:%S")
         cur = self.conn.cursor()
-        cur.execute(sql, [timestamp])
+        cur.execute(self._q(sql), [timestamp])
         self.conn.commit()
         return
 
@@ -271,13 +556,387 @@ class DB:
 
     def initLastUpdate(self):
         """
-        Initialize data in last_update table
+        Initialize data in last_update table. Another process
+        may insert the row at the same time, which is fine
         """
-        sql = """ INSERT INTO last_update(lastrun) values(?); """
+        sql = """ INSERT INTO last_update(id, lastrun) values(?, ?)
+                  ON CONFLICT(id) DO NOTHING; """
         if not self.getLastUpdate():
             cur = self.conn.cursor()
-            cur.execute(sql, ["Never"])
+            cur.execute(self._q(sql), [1, "Never"])
             self.conn.commit()
 
     def close(self):
-        self.conn.close()
\ No newline at end of file
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SQLiteDB(BaseDB):
+    """
+    Local single-file SQLite storage (default backend)
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        super().__init__()
+
+    def openDB(self):
+        """
+        Open SQLlite DB
+        """
+        self.conn = None
+        try:
+            self.conn = sqlite3.connect(self.path)
+        except Error as e:
+            print(e)
+
+    def createDB(self):
+        """
+        Create new table to contain switch info & port utilization data
+        """
+        sw_info_table = """ CREATE TABLE IF NOT EXISTS switches (
+            name text NOT NULL,
+            serial text DEFAULT "Not Polled Yet",
+            model text DEFAULT "N/A",
+            sw_ver text DEFAULT "N/A",
+            mgmt_ip text NOT NULL PRIMARY KEY,
+            last_check boolean DEFAULT False,
+            total_port integer DEFAULT 0,
+            up_port integer DEFAULT 0,
+            down_port integer DEFAULT 0,
+            disabled_port integer DEFAULT 0,
+            intop10m integer DEFAULT 0,
+            intop100m integer DEFAULT 0,
+            intop1g integer DEFAULT 0,
+            intop10g integer DEFAULT 0,
+            intop25g integer DEFAULT 0,
+            intop40g integer DEFAULT 0,
+            intop100g integer DEFAULT 0,
+            intmedcop integer DEFAULT 0,
+            intmedsfp integer DEFAULT 0,
+            intmedvirt integer DEFAULT 0
+        ); """
+        CONSUMED_IPs_TABLE = """ CREATE TABLE IF NOT EXISTS IPs_USED (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            IP_ADDRESS INTEGER DEFAULT 1
+            );
+            """
+
+        last_update_table = """ CREATE TABLE IF NOT EXISTS last_update (
+            id integer NOT NULL PRIMARY KEY,
+            lastrun text NOT NULL
+        ); """
+        collectors_table = """ CREATE TABLE IF NOT EXISTS collectors (
+            collector_id text NOT NULL PRIMARY KEY,
+            hostname text,
+            last_heartbeat real NOT NULL
+        ); """
+        device_ips_table = """ CREATE TABLE IF NOT EXISTS device_ips (
+            mgmt_ip text NOT NULL,
+            IP_ADDRESS text NOT NULL,
+            mac_address text,
+            interface text
+        ); """
+        device_ips_index = """ CREATE INDEX IF NOT EXISTS device_ips_mgmt_ip
+            ON device_ips (mgmt_ip); """
+        device_health_table = """ CREATE TABLE IF NOT EXISTS device_health (
+            mgmt_ip text NOT NULL PRIMARY KEY,
+            state text DEFAULT 'closed',
+            failures integer DEFAULT 0,
+            poll_interval real,
+            next_poll real DEFAULT 0,
+            last_success real,
+            last_up_port integer
+        ); """
+        port_history_table = """ CREATE TABLE IF NOT EXISTS port_history (
+            mgmt_ip text NOT NULL,
+            ts integer NOT NULL,
+            total_port integer DEFAULT 0,
+            up_port integer DEFAULT 0
+        ); """
+        port_history_index = """ CREATE INDEX IF NOT EXISTS port_history_ts
+            ON port_history (ts); """
+        interfaces_table = """ CREATE TABLE IF NOT EXISTS interfaces (
+            mgmt_ip text NOT NULL,
+            name text NOT NULL,
+            enabled boolean,
+            oper_status text,
+            bandwidth integer,
+            media_type text,
+            PRIMARY KEY (mgmt_ip, name)
+        ); """
+        cur = self.conn.cursor()
+        cur.execute(sw_info_table)
+        cur.execute(CONSUMED_IPs_TABLE)
+        cur.execute(last_update_table)
+        cur.execute(collectors_table)
+        cur.execute(device_ips_table)
+        cur.execute(device_ips_index)
+        cur.execute(device_health_table)
+        cur.execute(port_history_table)
+        cur.execute(port_history_index)
+        cur.execute(interfaces_table)
+
+    def add_used_ip(self,id, IP_ADDRESS):
+        """
+        Insert USED IP Addressese into DB
+        """
+        sql = """ INSERT OR IGNORE INTO IPs_USED(id,IP_ADDRESS) values(?,?);"""
+        cur = self.conn.cursor()
+        cur.execute(sql,(id,IP_ADDRESS))
+        self.conn.commit()
+        print("Adding Consumed IPs to the database")
+        return
+
+    def update_used_ip(self,id,IP_ADDRESS):
+        """
+        UPDATE IP USED Information
+        """
+        sql = """ UPDATE OR REPLACE IPs_USED SET
+                  id = ?,
+                  IP_ADDRESS = ?;
+        """
+        cur = self.conn.cursor()
+        cur.execute(sql,(id,IP_ADDRESS))
+        self.conn.commit()
+        return
+
+    def _bulkInsert(self, cur, table, columns, rows):
+        """
+        Insert rows with a single executemany
+        """
+        marks = ','.join('?' * len(columns))
+        sql = f"INSERT INTO {table}({','.join(columns)}) values({marks});"
+        cur.executemany(sql, rows)
+
+    def _bulkInsertMissing(self, cur, table, columns, rows):
+        """
+        Insert rows, skipping those that already exist
+        """
+        marks = ','.join('?' * len(columns))
+        sql = f"INSERT OR IGNORE INTO {table}({','.join(columns)}) values({marks});"
+        cur.executemany(sql, rows)
+
+
+# One connection pool per DSN, shared by every PostgresDB() in the process
+_pg_pools = {}
+# DSNs whose schema has already been created by this process
+_pg_schema_ready = set()
+# DSNs where port_history is a TimescaleDB hypertable
+_pg_hypertables = set()
+
+
+class PostgresDB(BaseDB):
+    """
+    PostgreSQL / TimescaleDB storage for multi-collector deployments.
+    Connections are borrowed from a process-wide pool and
+    bulk inserts are streamed with COPY
+    """
+    paramstyle = '%s'
+
+    def __init__(self, dsn=DB_DSN):
+        self.dsn = dsn
+        super().__init__()
+
+    def openDB(self):
+        """
+        Borrow a connection from the pool for this DSN.
+        Raises psycopg2.Error if none can be had
+        """
+        import psycopg2
+        import psycopg2.pool
+        self.IntegrityError = psycopg2.IntegrityError
+        self.conn = None
+        # Connection failures & an exhausted pool (PoolError) are raised,
+        # there is nothing useful to do without a connection
+        if self.dsn not in _pg_pools:
+            _pg_pools[self.dsn] = psycopg2.pool.ThreadedConnectionPool(
+                DB_POOL_MIN, DB_POOL_MAX, self.dsn)
+        self.pool = _pg_pools[self.dsn]
+        self.conn = self.pool.getconn()
+
+    def createDB(self):
+        """
+        Create the switch, consumed IP & last update tables
+        """
+        if self.dsn in _pg_schema_ready:
+            return
+        sw_info_table = """ CREATE TABLE IF NOT EXISTS switches (
+            name text NOT NULL,
+            serial text DEFAULT 'Not Polled Yet',
+            model text DEFAULT 'N/A',
+            sw_ver text DEFAULT 'N/A',
+            mgmt_ip text NOT NULL PRIMARY KEY,
+            last_check boolean DEFAULT false,
+            total_port integer DEFAULT 0,
+            up_port integer DEFAULT 0,
+            down_port integer DEFAULT 0,
+            disabled_port integer DEFAULT 0,
+            intop10m integer DEFAULT 0,
+            intop100m integer DEFAULT 0,
+            intop1g integer DEFAULT 0,
+            intop10g integer DEFAULT 0,
+            intop25g integer DEFAULT 0,
+            intop40g integer DEFAULT 0,
+            intop100g integer DEFAULT 0,
+            intmedcop integer DEFAULT 0,
+            intmedsfp integer DEFAULT 0,
+            intmedvirt integer DEFAULT 0
+        ); """
+        CONSUMED_IPs_TABLE = """ CREATE TABLE IF NOT EXISTS IPs_USED (
+            id SERIAL PRIMARY KEY,
+            IP_ADDRESS text
+            );
+            """
+        last_update_table = """ CREATE TABLE IF NOT EXISTS last_update (
+            id integer NOT NULL PRIMARY KEY,
+            lastrun text NOT NULL
+        ); """
+        collectors_table = """ CREATE TABLE IF NOT EXISTS collectors (
+            collector_id text NOT NULL PRIMARY KEY,
+            hostname text,
+            last_heartbeat double precision NOT NULL
+        ); """
+        device_ips_table = """ CREATE TABLE IF NOT EXISTS device_ips (
+            mgmt_ip text NOT NULL,
+            IP_ADDRESS text NOT NULL,
+            mac_address text,
+            interface text
+        ); """
+        device_ips_index = """ CREATE INDEX IF NOT EXISTS device_ips_mgmt_ip
+            ON device_ips (mgmt_ip); """
+        device_health_table = """ CREATE TABLE IF NOT EXISTS device_health (
+            mgmt_ip text NOT NULL PRIMARY KEY,
+            state text DEFAULT 'closed',
+            failures integer DEFAULT 0,
+            poll_interval double precision,
+            next_poll double precision DEFAULT 0,
+            last_success double precision,
+            last_up_port integer
+        ); """
+        port_history_table = """ CREATE TABLE IF NOT EXISTS port_history (
+            mgmt_ip text NOT NULL,
+            ts bigint NOT NULL,
+            total_port integer DEFAULT 0,
+            up_port integer DEFAULT 0
+        ); """
+        port_history_index = """ CREATE INDEX IF NOT EXISTS port_history_ts
+            ON port_history (ts); """
+        interfaces_table = """ CREATE TABLE IF NOT EXISTS interfaces (
+            mgmt_ip text NOT NULL,
+            name text NOT NULL,
+            enabled boolean,
+            oper_status text,
+            bandwidth bigint,
+            media_type text,
+            PRIMARY KEY (mgmt_ip, name)
+        ); """
+        cur = self.conn.cursor()
+        cur.execute(sw_info_table)
+        cur.execute(CONSUMED_IPs_TABLE)
+        cur.execute(last_update_table)
+        cur.execute(collectors_table)
+        cur.execute(device_ips_table)
+        cur.execute(device_ips_index)
+        cur.execute(device_health_table)
+        cur.execute(port_history_table)
+        cur.execute(port_history_index)
+        cur.execute(interfaces_table)
+        # Store history as a hypertable when TimescaleDB is installed
+        cur.execute(""" SELECT 1 FROM pg_extension
+                        WHERE extname = 'timescaledb'; """)
+        if cur.fetchone():
+            cur.execute(""" SELECT create_hypertable('port_history', 'ts',
+                            chunk_time_interval => 604800,
+                            if_not_exists => TRUE,
+                            migrate_data => TRUE); """)
+            _pg_hypertables.add(self.dsn)
+        self.conn.commit()
+        _pg_schema_ready.add(self.dsn)
+
+    def add_used_ip(self, id, IP_ADDRESS):
+        """
+        Insert USED IP Addressese into DB
+        """
+        sql = """ INSERT INTO IPs_USED(id,IP_ADDRESS) values(%s,%s)
+                  ON CONFLICT DO NOTHING; """
+        cur = self.conn.cursor()
+        cur.execute(sql, (id, IP_ADDRESS))
+        self.conn.commit()
+        print("Adding Consumed IPs to the database")
+        return
+
+    def update_used_ip(self, id, IP_ADDRESS):
+        """
+        UPDATE IP USED Information
+        """
+        sql = """ UPDATE IPs_USED SET IP_ADDRESS = %s WHERE id = %s; """
+        cur = self.conn.cursor()
+        cur.execute(sql, (IP_ADDRESS, id))
+        self.conn.commit()
+        return
+
+    def _bulkInsert(self, cur, table, columns, rows):
+        """
+        Stream rows into table with COPY, COPY_BATCH rows at a time
+        """
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if count % COPY_BATCH == 0:
+                buf.seek(0)
+                cur.copy_expert(sql, buf)
+                buf.seek(0)
+                buf.truncate()
+        if buf.tell():
+            buf.seek(0)
+            cur.copy_expert(sql, buf)
+        return count
+
+    def _bulkInsertMissing(self, cur, table, columns, rows):
+        """
+        Insert rows in batches, skipping those that already exist
+        """
+        from psycopg2.extras import execute_values
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+               f"ON CONFLICT DO NOTHING")
+        execute_values(cur, sql, rows, page_size=COPY_BATCH)
+
+    def _lockTable(self, cur, table):
+        """
+        Block other writers of table until this transaction ends
+        """
+        cur.execute(f""" LOCK TABLE {table} IN EXCLUSIVE MODE; """)
+
+    def prunePortHistory(self, before):
+        """
+        Delete port count samples taken before before (epoch seconds).
+        On a hypertable whole expired chunks are dropped first,
+        which is far cheaper than deleting their rows
+        """
+        if self.dsn in _pg_hypertables:
+            cur = self.conn.cursor()
+            cur.execute(""" SELECT drop_chunks('port_history',
+                            older_than => %s::bigint); """, [int(before)])
+            self.conn.commit()
+        return super().prunePortHistory(before)
+
+    def _streamCursor(self):
+        """
+        Server-side cursor, so exports never load a whole table
+        """
+        return self.conn.cursor(name='export')
+
+    def close(self):
+        """
+        Return the connection to the pool
+        """
+        if self.conn is not None:
+            self.conn.rollback()
+            self.pool.putconn(self.conn)
+            self.conn = None
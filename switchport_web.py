@@ -1,8 +1,11 @@
+import os
 from collections import Counter
 
-from flask import Flask, render_template
+from flask import Flask, abort, render_template, send_file
 from flask_bootstrap import Bootstrap
 
+import analytics
+import export
 import switchdb
 
 
@@ -47,7 +50,26 @@ def network_wide():
     across the entire network
     """
     network = getNetworkWide()
-    return render_template('network-wide.html', network=network)
+    fleet = analytics.getFleetAnalytics()
+    return render_template('network-wide.html', network=network,
+                           analytics=fleet)
+
+
+@app.route('/export/<filename>', methods=['GET'])
+def export_download(filename):
+    """
+    Download switches, interfaces, ips, arp or history
+    as csv, csv.gz or parquet, e.g. /export/switches.csv.gz
+    Files are built once per collector run
+    """
+    dataset, _, fmt = filename.partition('.')
+    if dataset not in export.DATASETS or fmt not in export.FORMATS:
+        abort(404)
+    path = export.cachedExport(dataset, fmt)
+    return send_file(os.path.abspath(path),
+                     mimetype=export.FORMATS[fmt],
+                     as_attachment=True,
+                     download_name=f"{dataset}.{fmt}")
 
 
 @app.route('/lastupdate', methods=['GET'])
@@ -56,9 +78,8 @@ def getLastUpdate():
     Check DB for last runtime of backend script
     This is published on the main page to see when stats were last updated
     """
-    swDB = switchdb.DB()
-    lastupdate = swDB.getLastUpdate()
-    swDB.close()
+    with switchdb.DB() as swDB:
+        lastupdate = swDB.getLastUpdate()
     return lastupdate
 
 # @app.route('/ip_list', methods=['GET'])
@@ -67,8 +88,8 @@ def get_ip_list():
     This page shows a summary of all IPs used
     across the entire network
     """
-    swDB = switchdb.DB()
-    ip_used_info = swDB.get_used_ip()
+    with switchdb.DB() as swDB:
+        ip_used_info = swDB.get_used_ip()
     used_ips = []
     for row in ip_used_info:
         row = list(row)
@@ -76,7 +97,6 @@ def get_ip_list():
         ip['id'] = row[0]
         ip['IP_ADDRESS'] = row[1]
         used_ips.append(ip)
-    swDB.close()
     return used_ips
 
 def getSwitchInfo():
@@ -84,8 +104,8 @@ def getSwitchInfo():
     Query DB for summary info on all
     switches currently monitored
     """
-    swDB = switchdb.DB()
-    raw_info = swDB.getAllSummary()
+    with switchdb.DB() as swDB:
+        raw_info = swDB.getAllSummary()
     switchList = []
     for row in raw_info:
         row = list(row)
@@ -104,7 +124,6 @@ def getSwitchInfo():
         else:
             switch['capacity'] = (switch['up'] / switch['total']) * 100
         switchList.append(switch)
-    swDB.close()
     return switchList
 
 
@@ -113,8 +132,8 @@ def getSwitchDetail(serial):
     Query DB for details on one specific device
     by serial number
     """
-    swDB = switchdb.DB()
-    raw_info = swDB.getSwitchDetail(serial)
+    with switchdb.DB() as swDB:
+        raw_info = swDB.getSwitchDetail(serial)
     switch = {}
     for row in raw_info:
         switch['name'] = row[0]
@@ -141,7 +160,6 @@ def getSwitchDetail(serial):
             switch['capacity'] = 0
         else:
             switch['capacity'] = int((switch['up'] / switch['total']) * 100)
-    swDB.close()
     return switch
 
 
@@ -150,9 +168,8 @@ def getNetworkWide():
     Query DB for all switch statistcs,
     then tally results & return to web page
     """
-    swDB = switchdb.DB()
-    result = swDB.getNetworkWideStats()
-    swDB.close()
+    with switchdb.DB() as swDB:
+        result = swDB.getNetworkWideStats()
     network = {
         'models': [],
         'swvers': [],
@@ -202,9 +219,8 @@ def deleteDevice(serial):
     """
     Call to DB to delete a device by serial number
     """
-    swDB = switchdb.DB()
-    swDB.deleteBySerial(serial)
-    swDB.close()
+    with switchdb.DB() as swDB:
+        swDB.deleteBySerial(serial)
 
 
 if __name__ == '__main__':
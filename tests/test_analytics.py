@@ -0,0 +1,134 @@
+import time
+
+import numpy as np
+import pytest
+
+import analytics
+import switchdb
+
+
+def _sums(samples, count):
+    """
+    Regression sums of loadHistory from (switch, day, up) samples
+    """
+    sums = np.zeros((5, count))
+    for idx, t, up in samples:
+        sums[:, idx] += (1, t, up, t * t, t * up)
+    return sums
+
+
+def test_growth_rates():
+    samples = [(0, 0, 10), (0, 1, 12), (0, 2, 14),   # +2 ports a day
+               (1, 0, 30), (1, 5, 30),               # flat
+               (2, 3, 7),                            # single sample
+               (3, 0, 20), (3, 4, 18)]               # shrinking
+    slope = analytics.growthRates(_sums(samples, 5))
+    assert slope == pytest.approx([2, 0, 0, -0.5, 0])
+
+
+def test_growth_rates_same_timestamp():
+    slope = analytics.growthRates(_sums([(0, 1.1, 5), (0, 1.1, 9)], 1))
+    assert slope.tolist() == [0]
+
+
+def test_growth_rates_empty():
+    assert analytics.growthRates(np.zeros((5, 0))).tolist() == []
+
+
+def test_group_stats():
+    keys = np.array(['C9300', 'C9300', 'N9K', 'C9200'], dtype=object)
+    total = np.array([48.0, 48.0, 96.0, 0.0])
+    up = np.array([24.0, 48.0, 24.0, 0.0])
+    utilization = np.divide(up * 100, total, out=np.zeros(4),
+                            where=total > 0)
+    groups = analytics.groupStats(keys, utilization, total, up)
+    # Unpolled switches are ignored, biggest groups first
+    assert groups == [
+        {'name': 'C9300', 'switches': 2, 'ports': 96, 'utilization': 75.0,
+         'p50': 75.0, 'p90': 95.0, 'max': 100.0},
+        {'name': 'N9K', 'switches': 1, 'ports': 96, 'utilization': 25.0,
+         'p50': 25.0, 'p90': 25.0, 'max': 25.0},
+    ]
+
+
+def test_group_stats_nothing_polled():
+    assert analytics.groupStats(np.array(['C9300'], dtype=object),
+                                np.zeros(1), np.zeros(1), np.zeros(1)) == []
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = switchdb.SQLiteDB(str(tmp_path / 'sw-util.db'))
+    yield db
+    db.close()
+
+
+def _switch(db, name, mgmt_ip, total, up, model='C9300-48P', history=()):
+    db.addSwitch(name, mgmt_ip)
+    db.updateSysInfo(name, mgmt_ip, {'serial': name, 'model': model,
+                                     'sw_ver': '17.3.4'})
+    cur = db.conn.cursor()
+    cur.execute(""" UPDATE switches SET total_port = ?, up_port = ?
+                    WHERE mgmt_ip = ?; """, (total, up, mgmt_ip))
+    now = int(time.time())
+    cur.executemany(""" INSERT INTO port_history(mgmt_ip, ts, total_port, up_port)
+                        values(?,?,?,?); """,
+                    [(mgmt_ip, now - days_ago * 86400, total, ports)
+                     for days_ago, ports in history])
+    db.conn.commit()
+
+
+def test_compute_analytics_empty(db):
+    result = analytics.computeAnalytics(db)
+    assert result == {'switches': 0, 'polled': 0, 'utilization': 0,
+                      'percentiles': [], 'models': [], 'growth': 0,
+                      'forecast': [(30, 0, 0), (90, 0, 0)],
+                      'exhaustion': []}
+
+
+def test_compute_analytics(db):
+    # Grows 1 port a day with 8 ports free
+    _switch(db, 'sw1', '10.0.0.1', 48, 40,
+            history=[(10, 30), (5, 35), (0, 40)])
+    # Stable
+    _switch(db, 'sw2', '10.0.0.2', 48, 24, history=[(20, 24), (0, 24)])
+    # Single sample - no trend
+    _switch(db, 'sw3', '10.0.0.3', 96, 48, model='N9K-C93180YC',
+            history=[(1, 48)])
+    # Never polled
+    db.addSwitch('sw4', '10.0.0.4')
+    # History of a switch no longer in the inventory is ignored
+    _switch(db, 'gone', '10.0.0.9', 48, 0, history=[(10, 0), (0, 48)])
+    db.deleteSwitch('10.0.0.9')
+    cur = db.conn.cursor()
+    cur.execute(""" INSERT INTO port_history VALUES ('10.0.0.9', ?, 48, 0),
+                    ('10.0.0.9', ?, 48, 48); """,
+                (int(time.time()) - 86400, int(time.time())))
+    db.conn.commit()
+
+    result = analytics.computeAnalytics(db)
+    assert result['switches'] == 4
+    assert result['polled'] == 3
+    assert result['utilization'] == round(112 / 192 * 100, 1)
+    assert [p for p, value in result['percentiles']] == [50, 90, 95, 99]
+    assert [group['name'] for group in result['models']] == [
+        'C9300-48P', 'N9K-C93180YC']
+    assert result['growth'] == 1.0
+    # sw1 fills up within 30 days, nothing else grows
+    assert result['forecast'] == [(30, 120, 1), (90, 120, 1)]
+    assert len(result['exhaustion']) == 1
+    assert result['exhaustion'][0]['name'] == 'sw1'
+    assert result['exhaustion'][0]['days'] == 8
+    assert result['exhaustion'][0]['growth'] == 1.0
+
+
+def test_fleet_analytics_cached_per_generation(db, monkeypatch):
+    monkeypatch.setattr(switchdb, 'DB_BACKEND', 'sqlite')
+    monkeypatch.setattr(switchdb, 'DB_PATH', db.path)
+    monkeypatch.setattr(analytics, '_cache',
+                        {'generation': None, 'result': None})
+    first = analytics.getFleetAnalytics()
+    assert analytics.getFleetAnalytics() is first
+    db.conn.execute(""" UPDATE last_update SET lastrun = 'next'; """)
+    db.conn.commit()
+    assert analytics.getFleetAnalytics() is not first
@@ -0,0 +1,154 @@
+import csv
+import gzip
+import io
+import os
+
+import pytest
+
+import export
+import switchdb
+
+
+def _batches(columns, *batches):
+    yield columns
+    yield from batches
+
+
+def _readCSV(data):
+    return list(csv.reader(io.StringIO(data.decode('utf-8'))))
+
+
+def test_write_csv():
+    out = io.BytesIO()
+    export.writeCSV(_batches(['a', 'b'], [(1, 'x,y')], [(2, None)]), out)
+    assert _readCSV(out.getvalue()) == [['a', 'b'], ['1', 'x,y'], ['2', '']]
+
+
+def test_write_csv_empty():
+    out = io.BytesIO()
+    export.writeCSV(_batches(['a', 'b']), out)
+    assert out.getvalue() == b'a,b\r\n'
+
+
+def test_write_parquet_null_first_batch():
+    pq = pytest.importorskip('pyarrow.parquet')
+    out = io.BytesIO()
+    export.writeParquet(_batches(['name', 'media'],
+                                 [('Gi1', None), ('Gi2', None)],
+                                 [('Gi3', 'SFP')]), out)
+    table = pq.read_table(io.BytesIO(out.getvalue()))
+    assert table.column_names == ['name', 'media']
+    assert str(table.schema.field('media').type) == 'string'
+    assert table.column('media').to_pylist() == [None, None, 'SFP']
+    assert pq.ParquetFile(io.BytesIO(out.getvalue())).num_row_groups == 2
+
+
+def test_write_parquet_empty():
+    pq = pytest.importorskip('pyarrow.parquet')
+    out = io.BytesIO()
+    export.writeParquet(_batches(['a', 'b']), out)
+    table = pq.read_table(io.BytesIO(out.getvalue()))
+    assert table.column_names == ['a', 'b']
+    assert table.num_rows == 0
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(switchdb, 'DB_BACKEND', 'sqlite')
+    monkeypatch.setattr(switchdb, 'DB_PATH', str(tmp_path / 'sw-util.db'))
+    monkeypatch.setattr(export, 'EXPORT_DIR', str(tmp_path / 'exports'))
+    with switchdb.DB() as swDB:
+        swDB.syncSwitches({'10.0.0.1': 'sw1', '10.0.0.2': 'sw2'})
+        swDB.replaceInterfaces('10.0.0.1', [
+            ('Gi1/0/1', True, 'up', 1000000, None),
+            ('Gi1/0/2', False, 'down', 1000000, None)])
+        swDB.replaceUsedIPs([(1, '10.1.1.1'), (2, '10.1.1.2')])
+        swDB.replaceDeviceIPs('10.0.0.1',
+                              [('10.1.1.1', 'aabb.cc00.0101', 'Vlan1')])
+        swDB.addPortHistory('10.0.0.1', {'total_port': 48, 'up_port': 30})
+        yield swDB
+
+
+def _expected(swDB, dataset):
+    batches = swDB.exportRows(dataset)
+    columns = next(batches)
+    return columns, [list(row) for rows in batches for row in rows]
+
+
+@pytest.mark.parametrize('fmt', export.FORMATS)
+@pytest.mark.parametrize('dataset', export.DATASETS)
+def test_write_export(db, dataset, fmt):
+    columns, rows = _expected(db, dataset)
+    assert rows
+    out = io.BytesIO()
+    if fmt == 'parquet':
+        pq = pytest.importorskip('pyarrow.parquet')
+        export.writeExport(dataset, fmt, out)
+        table = pq.read_table(io.BytesIO(out.getvalue()))
+        assert table.column_names == columns
+        assert [list(row.values()) for row in table.to_pylist()] == rows
+        return
+    export.writeExport(dataset, fmt, out)
+    data = out.getvalue()
+    if fmt == 'csv.gz':
+        data = gzip.decompress(data)
+    assert _readCSV(data) == [columns] + [
+        ['' if value is None else str(value) for value in row]
+        for row in rows]
+
+
+def test_write_export_rejects_unknown():
+    with pytest.raises(ValueError, match='Unknown dataset'):
+        export.writeExport('passwords', 'csv', io.BytesIO())
+    with pytest.raises(ValueError, match='Unknown export format'):
+        export.writeExport('switches', 'xlsx', io.BytesIO())
+
+
+def test_cached_export(db):
+    path = export.cachedExport('switches', 'csv.gz')
+    name = os.path.basename(path)
+    assert name == f"switches-{export.getGeneration()}.csv.gz"
+    assert _readCSV(gzip.decompress(open(path, 'rb').read()))[1][0] == 'sw1'
+    # Reused until the collector runs again
+    mtime = os.stat(path).st_mtime_ns
+    assert export.cachedExport('switches', 'csv.gz') == path
+    assert os.stat(path).st_mtime_ns == mtime
+    other = export.cachedExport('ips', 'csv.gz')
+
+    db.conn.execute(""" UPDATE last_update SET lastrun = 'next run'; """)
+    db.conn.commit()
+    newer = export.cachedExport('switches', 'csv.gz')
+    assert newer != path
+    # Older generations of the same export are removed, others are kept
+    assert sorted(os.listdir(export.EXPORT_DIR)) == sorted(
+        [os.path.basename(newer), os.path.basename(other)])
+    assert oct(os.stat(newer).st_mode & 0o777) == oct(0o644)
+
+
+def test_cached_export_failure_leaves_no_files(db, monkeypatch):
+    def broken(dataset, fmt, fileobj):
+        fileobj.write(b'partial')
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(export, 'writeExport', broken)
+    with pytest.raises(RuntimeError):
+        export.cachedExport('switches', 'csv')
+    assert os.listdir(export.EXPORT_DIR) == []
+
+
+def test_cached_export_concurrent(db, monkeypatch):
+    # Requests racing on the same export each build a private temp file
+    writeExport = export.writeExport
+    paths = []
+
+    def racing(dataset, fmt, fileobj):
+        if not paths:
+            paths.append(None)
+            paths[0] = export.cachedExport(dataset, fmt)
+        writeExport(dataset, fmt, fileobj)
+
+    monkeypatch.setattr(export, 'writeExport', racing)
+    path = export.cachedExport('switches', 'csv')
+    assert paths == [path]
+    assert os.listdir(export.EXPORT_DIR) == [os.path.basename(path)]
+    assert _readCSV(open(path, 'rb').read())[0][0] == 'name'
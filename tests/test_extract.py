@@ -0,0 +1,117 @@
+import sys
+
+from extract import ArpRecord, iter_arp, iter_extract, iter_path, json_extract
+
+TREE = {
+    'version': {'version': '17.3.4', 'chassis_sn': 'FOC1234X0AB'},
+    'interfaces': [
+        {'name': 'Gi1/0/1', 'ip': '10.0.0.1', 'vlans': [{'ip': '10.9.0.1'}]},
+        {'name': 'Gi1/0/2', 'ip': None},
+        ['nested', {'ip': '10.0.0.3'}],
+    ],
+    'ip': '192.168.0.1',
+    'empty': {},
+}
+
+ARP = {
+    'interfaces': {
+        'Vlan10': {'ipv4': {'neighbors': {
+            '10.0.10.1': {'ip': '10.0.10.1',
+                          'link_layer_address': 'aabb.cc00.0101',
+                          'physical_interface': 'Vlan10'},
+            '10.0.10.2': {'link_layer_address': 'aabb.cc00.0102'},
+        }}},
+        'GigabitEthernet0/0': {'ipv4': {'neighbors': {
+            '192.168.0.1': {'ip': '192.168.0.1',
+                            'link_layer_address': '0011.2233.44ff',
+                            'physical_interface': 'GigabitEthernet0/0'},
+        }}},
+        'Loopback0': {},
+    },
+}
+
+
+def _recursive_extract(obj, key):
+    """
+    The original recursive json_extract, kept as a reference
+    """
+    arr = []
+
+    def extract(obj, arr, key):
+        if isinstance(obj, dict):
+            for k, v in obj.items():
+                if isinstance(v, (dict, list)):
+                    extract(v, arr, key)
+                elif k == key:
+                    arr.append(v)
+        elif isinstance(obj, list):
+            for item in obj:
+                extract(item, arr, key)
+        return arr
+
+    return extract(obj, arr, key)
+
+
+def test_iter_extract_matches_recursive_version():
+    for key in ('ip', 'version', 'chassis_sn', 'name', 'missing'):
+        assert list(iter_extract(TREE, key)) == _recursive_extract(TREE, key)
+        assert json_extract(TREE, key) == _recursive_extract(TREE, key)
+    assert json_extract(TREE, 'ip') == ['10.0.0.1', '10.9.0.1', None,
+                                        '10.0.0.3', '192.168.0.1']
+    assert json_extract(ARP, 'link_layer_address') == _recursive_extract(
+        ARP, 'link_layer_address')
+
+
+def test_iter_extract_scalars():
+    assert json_extract('text', 'ip') == []
+    assert json_extract([], 'ip') == []
+
+
+def test_iter_extract_is_lazy():
+    values = iter_extract(TREE, 'ip')
+    assert next(values) == '10.0.0.1'
+
+
+def test_iter_extract_deeper_than_recursion_limit():
+    depth = sys.getrecursionlimit() * 3
+    tree = {'ip': 'top'}
+    node = tree
+    for i in range(depth):
+        node['child'] = [{'ip': str(i)}] if i % 2 else {'ip': str(i)}
+        node = node['child'][0] if i % 2 else node['child']
+    values = json_extract(tree, 'ip')
+    assert len(values) == depth + 1
+    assert values[0] == 'top' and values[-1] == str(depth - 1)
+
+
+def test_iter_path():
+    assert list(iter_path(TREE, 'version.version')) == ['17.3.4']
+    assert list(iter_path(TREE, 'interfaces.*.ip')) == ['10.0.0.1', None]
+    assert list(iter_path(TREE, 'interfaces.0.vlans.0.ip')) == ['10.9.0.1']
+    assert list(iter_path(TREE, 'interfaces.2.1.ip')) == ['10.0.0.3']
+    assert list(iter_path(TREE, ['interfaces', '1', 'name'])) == ['Gi1/0/2']
+    assert len(list(iter_path(ARP, 'interfaces.*.ipv4.neighbors.*'))) == 3
+    assert list(iter_path(ARP, 'interfaces.*.ipv4.neighbors.*.ip')) == [
+        '10.0.10.1', '192.168.0.1']
+
+
+def test_iter_path_misses():
+    assert list(iter_path(TREE, 'interfaces.7.ip')) == []
+    assert list(iter_path(TREE, 'interfaces.first.ip')) == []
+    assert list(iter_path(TREE, 'ip.more')) == []
+    assert list(iter_path(TREE, 'empty.*')) == []
+    assert list(iter_path(TREE, 'nothing')) == []
+
+
+def test_iter_path_empty_path():
+    assert list(iter_path(TREE, [])) == [TREE]
+
+
+def test_iter_arp():
+    assert list(iter_arp(ARP)) == [
+        ArpRecord('10.0.10.1', 'aabb.cc00.0101', 'Vlan10'),
+        # Missing fields fall back to the neighbor key & interface name
+        ArpRecord('10.0.10.2', 'aabb.cc00.0102', 'Vlan10'),
+        ArpRecord('192.168.0.1', '0011.2233.44ff', 'GigabitEthernet0/0'),
+    ]
+    assert list(iter_arp({})) == []
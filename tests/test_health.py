@@ -0,0 +1,119 @@
+import pytest
+
+import health
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setattr(health, 'FAILURE_THRESHOLD', 3)
+    monkeypatch.setattr(health, 'BACKOFF_BASE', 900)
+    monkeypatch.setattr(health, 'BACKOFF_MAX', 86400)
+    monkeypatch.setattr(health, 'POLL_INTERVAL_MIN', 300)
+    monkeypatch.setattr(health, 'POLL_INTERVAL_MAX', 14400)
+
+
+def _ports(up, total=48):
+    return {'up_port': up, 'total_port': total}
+
+
+def test_new_device_is_due():
+    record = health.newHealth()
+    assert health.isDue(record, now=0)
+    assert record['state'] == health.CLOSED
+
+
+def test_failures_below_threshold_retry_next_sweep():
+    record = health.newHealth()
+    for failures in (1, 2):
+        health.recordFailure(record, now=1000)
+        assert record['failures'] == failures
+        assert record['state'] == health.CLOSED
+        assert health.isDue(record, now=1000)
+
+
+def test_threshold_opens_circuit():
+    record = health.newHealth()
+    for _ in range(3):
+        health.recordFailure(record, now=1000)
+    assert record['state'] == health.OPEN
+    assert record['next_poll'] == 1000 + 900
+    assert not health.isDue(record, now=1899)
+    assert record['state'] == health.OPEN
+
+
+def test_backoff_doubles_up_to_max():
+    record = health.newHealth()
+    backoffs = []
+    for _ in range(12):
+        health.recordFailure(record, now=0)
+        backoffs.append(record['next_poll'])
+    assert backoffs[2:] == [900, 1800, 3600, 7200, 14400, 28800, 57600,
+                            86400, 86400, 86400]
+
+
+def test_open_circuit_goes_half_open_after_backoff():
+    record = health.newHealth()
+    for _ in range(3):
+        health.recordFailure(record, now=0)
+    assert health.isDue(record, now=900)
+    assert record['state'] == health.HALF_OPEN
+
+
+def test_half_open_failure_reopens_with_longer_backoff():
+    record = health.newHealth()
+    for _ in range(3):
+        health.recordFailure(record, now=0)
+    assert health.isDue(record, now=900)
+    health.recordFailure(record, now=900)
+    assert record['state'] == health.OPEN
+    assert record['next_poll'] == 900 + 1800
+
+
+def test_success_closes_circuit():
+    record = health.newHealth()
+    for _ in range(4):
+        health.recordFailure(record, now=0)
+    assert health.isDue(record, now=5000)
+    health.recordSuccess(record, _ports(10), now=5000)
+    assert record['state'] == health.CLOSED
+    assert record['failures'] == 0
+    assert record['last_success'] == 5000
+    assert record['last_up_port'] == 10
+    assert record['next_poll'] == 5000 + record['interval']
+
+
+def test_stable_switch_interval_grows_to_max():
+    record = health.newHealth()
+    intervals = []
+    for _ in range(8):
+        health.recordSuccess(record, _ports(10), now=0)
+        intervals.append(record['interval'])
+    assert intervals[0] == health.POLL_INTERVAL * 1.5
+    assert intervals == sorted(intervals)
+    assert intervals[-1] == 14400
+
+
+def test_busy_switch_interval_halves_to_min():
+    record = health.newHealth()
+    record['interval'] = 14400
+    intervals = []
+    for _ in range(8):
+        health.recordSuccess(record, _ports(40), now=0)
+        intervals.append(record['interval'])
+    assert intervals[:3] == [7200, 3600, 1800]
+    assert intervals[-1] == 300
+
+
+def test_changing_switch_interval_halves():
+    record = health.newHealth()
+    record['interval'] = 1200
+    health.recordSuccess(record, _ports(10), now=0)
+    assert record['interval'] == 1800
+    health.recordSuccess(record, _ports(11), now=0)
+    assert record['interval'] == 900
+
+
+def test_unpolled_ports_count_as_idle():
+    record = health.newHealth()
+    health.recordSuccess(record, _ports(0, total=0), now=0)
+    assert record['interval'] == health.POLL_INTERVAL * 1.5
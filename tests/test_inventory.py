@@ -0,0 +1,155 @@
+import time
+
+import pytest
+
+import inventory
+from inventory import InventoryError
+
+SWITCH = """    type: ios-xe
+    address: {address}
+    username: admin
+    password: secret
+"""
+
+
+def _write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def _device(**settings):
+    device = {'type': 'ios-xe', 'address': '10.0.0.1',
+              'username': 'admin', 'password': 'secret'}
+    device.update(settings)
+    return device
+
+
+def _errors(devices):
+    with pytest.raises(InventoryError) as excinfo:
+        inventory.validate(devices)
+    return str(excinfo.value)
+
+
+def test_load_yaml(tmp_path):
+    config = _write(tmp_path / 'config.yml', "Devices:\n  sw1:\n"
+                    + SWITCH.format(address='10.0.0.1') + "    port: '2222'\n")
+    devices = inventory.loadInventory(config)
+    assert devices == {'sw1': _device(port=2222, collector='ssh')}
+
+
+def test_includes_yaml_and_csv(tmp_path):
+    (tmp_path / 'sites').mkdir()
+    _write(tmp_path / 'sites' / 'site-a.yml', "Devices:\n  sw2:\n"
+           + SWITCH.format(address='10.0.0.2') + "Include: access.csv\n")
+    _write(tmp_path / 'sites' / 'access.csv',
+           "name,type,address,collector,community,snmp_version,username\n"
+           "sw3,nx-os,sw3.example.com,snmp,private,2c,\n"
+           " sw4 ,ios-xe,10.0.0.4,snmp,,,\n")
+    config = _write(tmp_path / 'config.yml',
+                    "Devices:\n  sw1:\n" + SWITCH.format(address='10.0.0.1')
+                    + "Include:\n  - sites/site-a.yml\n")
+    devices = inventory.loadInventory(config)
+    assert list(devices) == ['sw1', 'sw2', 'sw3', 'sw4']
+    assert devices['sw3'] == {'type': 'nx-os', 'address': 'sw3.example.com',
+                              'collector': 'snmp', 'community': 'private',
+                              'snmp_version': '2c'}
+    # Empty cells are skipped
+    assert devices['sw4'] == {'type': 'ios-xe', 'address': '10.0.0.4',
+                              'collector': 'snmp'}
+
+
+def test_circular_include(tmp_path):
+    _write(tmp_path / 'a.yml', "Include: b.yml\n")
+    _write(tmp_path / 'b.yml', "Include: a.yml\n")
+    with pytest.raises(InventoryError, match='circular include'):
+        inventory.loadInventory(str(tmp_path / 'a.yml'))
+
+
+@pytest.mark.parametrize('text, message', [
+    ("Devices: [sw1, sw2]\n", "'Devices' must be a mapping"),
+    ("Include: {a: b}\n", "'Include' must be a file name"),
+    ("Include: missing.yml\n", "inventory file not found"),
+    ("Devices:\n  sw1: {type: ios-xe\n", "invalid YAML"),
+    ("- sw1\n", "expected a mapping at top level"),
+])
+def test_malformed_yaml(tmp_path, text, message):
+    config = _write(tmp_path / 'config.yml', text)
+    with pytest.raises(InventoryError, match=message):
+        inventory.loadInventory(config)
+
+
+def test_duplicate_names(tmp_path):
+    _write(tmp_path / 'more.csv', "name,type,address\nsw1,ios-xe,10.0.0.2\n")
+    config = _write(tmp_path / 'config.yml',
+                    "Devices:\n  sw1:\n" + SWITCH.format(address='10.0.0.1')
+                    + "Include: more.csv\n")
+    with pytest.raises(InventoryError, match='device sw1 is defined twice'):
+        inventory.loadInventory(config)
+
+
+def test_csv_errors(tmp_path):
+    missing = _write(tmp_path / 'missing.csv', "name,address\n,10.0.0.1\n")
+    with pytest.raises(InventoryError, match=r'missing.csv:2: missing device'):
+        inventory.loadInventory(missing)
+    twice = _write(tmp_path / 'twice.csv', "name\nsw1\nsw1\n")
+    with pytest.raises(InventoryError, match=r'twice.csv:3: duplicate device'):
+        inventory.loadInventory(twice)
+
+
+def test_validate_normalizes():
+    devices = inventory.validate({
+        'sw1': _device(address='::ffff:10.0.0.1', snmp_port='161'),
+        'sw2': _device(address='sw2.example.com.', collector='snmp',
+                       snmp_version='2c'),
+    })
+    assert devices['sw1']['address'] == '::ffff:a00:1'
+    assert devices['sw1']['snmp_port'] == 161
+    assert devices['sw2']['address'] == 'sw2.example.com.'
+
+
+def test_validate_collects_all_errors():
+    message = _errors({
+        'sw1': _device(type='junos', colour='red'),
+        'sw2': _device(address='10.0.0.1', password=None),
+        'sw3': _device(address='10.0.0.300', port=0),
+        'sw4': _device(address='10.0.0.4', collector='telnet',
+                       snmp_port='x'),
+        'sw5': _device(address='10.0.0.5', snmp_port=None,
+                       snmp_version='1'),
+        'sw6': 'not a mapping',
+    })
+    lines = message.splitlines()[1:]
+    assert [line.strip() for line in lines] == [
+        "sw1: unknown key 'colour'",
+        "sw1: type must be one of ios-xe, nx-os",
+        "sw2: 'password' is required for SSH",
+        "sw2: address 10.0.0.1 already used by sw1",
+        "sw3: invalid address '10.0.0.300'",
+        "sw3: invalid port '0'",
+        "sw4: collector must be one of ssh, snmp",
+        "sw4: invalid snmp_port 'x'",
+        "sw5: invalid snmp_port 'None'",
+        "sw5: snmp_version must be one of 2c",
+        "sw6: expected a mapping of device settings",
+    ]
+
+
+@pytest.mark.parametrize('address', [
+    'a' * 28 + '!',
+    'access-sw-building-b-flr3_old',
+    'a' * 64 + '.example.com',
+    'sw1..example.com',
+    'x' * 254,
+    '',
+])
+def test_invalid_hostname_is_fast(address):
+    start = time.monotonic()
+    assert 'invalid address' in _errors({'sw1': _device(address=address)})
+    assert time.monotonic() - start < 1
+
+
+def test_snmp_does_not_need_credentials():
+    devices = inventory.validate({'sw1': {'type': 'ios-xe',
+                                          'address': '10.0.0.1',
+                                          'collector': 'snmp'}})
+    assert devices['sw1']['collector'] == 'snmp'
@@ -0,0 +1,48 @@
+import pytest
+
+import sharding
+import switchdb
+
+
+@pytest.fixture
+def sqlite(tmp_path, monkeypatch):
+    monkeypatch.setattr(switchdb, 'DB_BACKEND', 'sqlite')
+    monkeypatch.setattr(switchdb, 'DB_PATH', str(tmp_path / 'sw-util.db'))
+
+
+DEVICES = {f"sw{i}": {'address': f"10.0.{i // 256}.{i % 256}"}
+           for i in range(1000)}
+
+
+def test_ring_is_stable_and_balanced():
+    ring = sharding.HashRing(['a', 'b', 'c'])
+    owners = [ring.owner(dev['address']) for dev in DEVICES.values()]
+    assert owners == [sharding.HashRing(['c', 'b', 'a']).owner(dev['address'])
+                      for dev in DEVICES.values()]
+    for node in 'abc':
+        assert 200 < owners.count(node) < 500
+
+
+def test_ring_moves_only_departed_devices():
+    before = sharding.HashRing(['a', 'b', 'c'])
+    after = sharding.HashRing(['a', 'b'])
+    for dev in DEVICES.values():
+        if before.owner(dev['address']) != 'c':
+            assert after.owner(dev['address']) == before.owner(dev['address'])
+
+
+def test_simultaneous_join_splits_devices(sqlite, monkeypatch):
+    # Collector b heartbeats while a is waiting to settle
+    monkeypatch.setattr(sharding.time, 'sleep',
+                        lambda seconds: sharding.heartbeat('b'))
+    owned_a = sharding.claimDevices(DEVICES, 'a', settle=5)
+    monkeypatch.setattr(sharding.time, 'sleep', pytest.fail)
+    owned_b = sharding.claimDevices(DEVICES, 'b', settle=5)
+    assert not owned_a.keys() & owned_b.keys()
+    assert len(owned_a) + len(owned_b) == len(DEVICES)
+
+
+def test_active_collector_does_not_wait(sqlite, monkeypatch):
+    sharding.heartbeat('a')
+    monkeypatch.setattr(sharding.time, 'sleep', pytest.fail)
+    assert len(sharding.claimDevices(DEVICES, 'a', settle=5)) == len(DEVICES)
@@ -0,0 +1,183 @@
+"""SNMP mapping & polling against tests/snmpsim/public.snmprec,
+a simulated Catalyst 9300 with 60 access ports."""
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip('pysnmp')
+
+from pysnmp.proto.rfc1902 import Gauge32, Integer, OctetString  # noqa: E402
+
+import snmp_collector  # noqa: E402
+from snmp_collector import (ENT_PHYSICAL_CLASS,  # noqa: E402
+                            ENT_PHYSICAL_MODEL_NAME,
+                            ENT_PHYSICAL_SERIAL_NUM,
+                            ENT_PHYSICAL_SOFTWARE_REV, IF_ADMIN_STATUS,
+                            IF_DESCR, IF_HIGH_SPEED, IF_OPER_STATUS,
+                            IP_NET_TO_MEDIA_PHYS_ADDRESS)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snmpsim')
+
+
+def test_map_interfaces():
+    table = {
+        IF_DESCR: {'1': OctetString('GigabitEthernet1/0/1'),
+                   '2': OctetString('GigabitEthernet1/0/2'),
+                   '3': OctetString('TenGigabitEthernet1/1/1')},
+        IF_ADMIN_STATUS: {'1': Integer(1), '2': Integer(2), '3': Integer(1)},
+        IF_OPER_STATUS: {'1': Integer(1), '2': Integer(2), '3': Integer(2)},
+        IF_HIGH_SPEED: {'1': Gauge32(1000), '2': Gauge32(1000)},
+    }
+    assert snmp_collector.mapInterfaces(table) == {
+        'GigabitEthernet1/0/1': {'enabled': True, 'oper_status': 'up',
+                                 'bandwidth': 1_000_000},
+        'GigabitEthernet1/0/2': {'enabled': False, 'oper_status': 'down',
+                                 'bandwidth': 1_000_000},
+        'TenGigabitEthernet1/1/1': {'enabled': True, 'oper_status': 'down',
+                                    'bandwidth': 0},
+    }
+
+
+def test_map_system_info_prefers_chassis():
+    table = {
+        ENT_PHYSICAL_CLASS: {'1000': Integer(9), '1': Integer(3)},
+        ENT_PHYSICAL_SOFTWARE_REV: {'1': OctetString(''),
+                                    '1000': OctetString('17.3.4')},
+        ENT_PHYSICAL_SERIAL_NUM: {'1': OctetString('FOC1234X0AB'),
+                                  '1000': OctetString('')},
+        ENT_PHYSICAL_MODEL_NAME: {'1': OctetString('C9300-48P'),
+                                  '1000': OctetString('')},
+    }
+    assert snmp_collector.mapSystemInfo(table) == {
+        'serial': 'FOC1234X0AB', 'model': 'C9300-48P', 'sw_ver': '17.3.4'}
+
+
+def test_map_system_info_without_entities():
+    empty = {column: {} for column in (ENT_PHYSICAL_CLASS,
+                                       ENT_PHYSICAL_SOFTWARE_REV,
+                                       ENT_PHYSICAL_SERIAL_NUM,
+                                       ENT_PHYSICAL_MODEL_NAME)}
+    with pytest.raises(snmp_collector.SNMPError):
+        snmp_collector.mapSystemInfo(empty)
+
+
+def test_map_arp():
+    table = {IP_NET_TO_MEDIA_PHYS_ADDRESS: {
+        '62.10.0.0.1': OctetString(hexValue='aabbcc000101'),
+        '7.10.0.0.2': OctetString(hexValue='aabbcc000102'),
+    }}
+    assert list(snmp_collector.mapArp(table, {'62': 'Vlan1'})) == [
+        ('10.0.0.1', 'aabb.cc00.0101', 'Vlan1'),
+        ('10.0.0.2', 'aabb.cc00.0102', '7'),
+    ]
+
+
+def _freePort():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope='module')
+def agent(tmp_path_factory):
+    """
+    Serve the recorded fixtures with snmpsim, yield the device config
+    """
+    pytest.importorskip('snmpsim')
+    workdir = tmp_path_factory.mktemp('snmpsim')
+    data = workdir / 'data'
+    shutil.copytree(FIXTURES, data)
+    log = workdir / 'responder.log'
+    port = _freePort()
+    env = dict(os.environ, SNMPSIM_ALLOW_ROOT='true')
+    with open(log, 'w') as output:
+        proc = subprocess.Popen(
+            [sys.executable, '-m', 'snmpsim.commands.responder',
+             f'--data-dir={data}', f'--cache-dir={workdir / "cache"}',
+             f'--agent-udpv4-endpoint=127.0.0.1:{port}'],
+            stdout=output, stderr=subprocess.STDOUT, env=env)
+    try:
+        deadline = time.time() + 30
+        while 'Listening at' not in log.read_text():
+            if proc.poll() is not None or time.time() > deadline:
+                pytest.skip(f"snmpsim did not start:\n{log.read_text()}")
+            time.sleep(0.1)
+        yield {'address': '127.0.0.1', 'snmp_port': port,
+               'community': 'public', 'collector': 'snmp'}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def test_bulk_walk_uses_getbulk(agent, monkeypatch):
+    requests = []
+    bulk_cmd = snmp_collector.bulk_cmd
+
+    async def counting(*args, **kwargs):
+        requests.append(args)
+        return await bulk_cmd(*args, **kwargs)
+
+    monkeypatch.setattr(snmp_collector, 'bulk_cmd', counting)
+
+    async def walk():
+        engine = snmp_collector.SnmpEngine()
+        auth = snmp_collector.CommunityData('public', mpModel=1)
+        target = await snmp_collector.UdpTransportTarget.create(
+            ('127.0.0.1', agent['snmp_port']), timeout=2, retries=0)
+        try:
+            return await snmp_collector.bulkWalk(
+                engine, auth, target, (IF_DESCR, IF_OPER_STATUS))
+        finally:
+            engine.close_dispatcher()
+
+    table = asyncio.run(walk())
+    assert len(table[IF_DESCR]) == 62
+    assert table[IF_DESCR]['62'] == OctetString('Vlan1')
+    assert set(table[IF_OPER_STATUS]) == set(table[IF_DESCR])
+    # 62 rows at MAX_REPETITIONS=50 per request, not one request per row
+    assert len(requests) <= 3
+
+
+def test_poll_devices(agent):
+    result = snmp_collector.pollDevices({'sw1': agent})['sw1']
+    assert not isinstance(result, Exception), result
+    sysinfo, intdata, arp = result
+    assert sysinfo == {'serial': 'FOC1234X0AB', 'model': 'C9300-48P',
+                       'sw_ver': '17.3.4'}
+    assert len(intdata) == 62
+    # ARP entries stream into replaceDeviceIPs instead of a list
+    assert not isinstance(arp, list)
+    assert intdata['GigabitEthernet1/0/59'] == {
+        'enabled': True, 'oper_status': 'up', 'bandwidth': 10_000_000}
+    assert sorted(arp) == [
+        ('10.0.0.1', 'aabb.cc00.0101', 'Vlan1'),
+        ('10.0.0.2', 'aabb.cc00.0102', 'Vlan1'),
+        ('10.0.0.3', 'aabb.cc00.0103', 'Vlan1'),
+        ('192.168.0.1', '0011.2233.44ff', 'GigabitEthernet0/0'),
+    ]
+
+
+def test_poll_devices_port_counts(agent):
+    # The collector needs scrapli for its SSH path
+    data_collector = pytest.importorskip('data_collector')
+    sysinfo, intdata, arp = snmp_collector.pollDevices({'sw1': agent})['sw1']
+    portinfo = data_collector.summarizeInterfaces(intdata)
+    assert (portinfo['total_port'], portinfo['up_port'],
+            portinfo['down_port'], portinfo['disabled_port']) == (60, 30, 24, 6)
+    assert (portinfo['intop1g'], portinfo['intop10g']) == (29, 1)
+    assert portinfo['intmedsfp'] == 60
+
+
+def test_poll_devices_reports_failures(agent):
+    results = snmp_collector.pollDevices({
+        'v1': dict(agent, snmp_version='1'),
+        'sw1': agent,
+    })
+    assert isinstance(results['v1'], snmp_collector.SNMPError)
+    assert not isinstance(results['sw1'], Exception)
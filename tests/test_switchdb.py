@@ -0,0 +1,346 @@
+"""BaseDB contract, run against SQLite and (when reachable) PostgreSQL.
+
+Start a throwaway server with
+    docker run -e POSTGRES_PASSWORD=test -p 5432:5432 postgres
+or point SWITCHDB_TEST_DSN at an existing database.
+"""
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+import health
+import switchdb
+
+PG_DSN = os.environ.get(
+    'SWITCHDB_TEST_DSN',
+    'host=localhost user=postgres password=test dbname=postgres')
+
+PORTINFO = {
+    'total_port': 48, 'up_port': 30, 'down_port': 16, 'disabled_port': 2,
+    'intop10m': 0, 'intop100m': 4, 'intop1g': 24, 'intop10g': 2,
+    'intop25g': 0, 'intop40g': 0, 'intop100g': 0,
+    'intmedcop': 44, 'intmedsfp': 4, 'intmedvirtual': 0,
+}
+SYSINFO = {'serial': 'FOC1234X0AB', 'model': 'C9300-48P', 'sw_ver': '17.3.4'}
+
+
+def _pgSchema():
+    """
+    Create a private schema for one test, skip if PostgreSQL is unavailable.
+    Returns (admin connection, schema name)
+    """
+    psycopg2 = pytest.importorskip('psycopg2')
+    try:
+        admin = psycopg2.connect(PG_DSN, connect_timeout=2)
+    except psycopg2.Error as e:
+        pytest.skip(f"PostgreSQL not available: {e}")
+    admin.autocommit = True
+    schema = f"switchdb_test_{uuid.uuid4().hex[:12]}"
+    admin.cursor().execute(f"CREATE SCHEMA {schema}")
+    return admin, schema
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def backend(request, tmp_path):
+    """
+    Factory for DB instances sharing one empty database
+    """
+    if request.param == 'sqlite':
+        path = str(tmp_path / 'sw-util.db')
+        opened = []
+
+        def connect():
+            opened.append(switchdb.SQLiteDB(path))
+            return opened[-1]
+        yield connect
+        for db in opened:
+            if db.conn is not None:
+                db.close()
+        return
+
+    admin, schema = _pgSchema()
+    dsn = f"{PG_DSN} options='-csearch_path={schema},public'"
+    opened = []
+
+    def connect():
+        opened.append(switchdb.PostgresDB(dsn))
+        return opened[-1]
+    try:
+        yield connect
+    finally:
+        for db in opened:
+            db.close()
+        pool = switchdb._pg_pools.pop(dsn, None)
+        if pool is not None:
+            pool.closeall()
+        switchdb._pg_schema_ready.discard(dsn)
+        admin.cursor().execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
+
+
+@pytest.fixture
+def db(backend):
+    return backend()
+
+
+def test_incomplete_backend_fails_on_creation():
+    class PartialDB(switchdb.BaseDB):
+        def openDB(self):
+            pass
+
+        def createDB(self):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialDB()
+
+
+def test_context_manager_closes(backend):
+    with pytest.raises(RuntimeError):
+        with backend() as swDB:
+            raise RuntimeError
+    assert swDB.conn is None
+
+
+def test_failed_init_releases_connection(backend, monkeypatch):
+    db = backend()
+    monkeypatch.setattr(type(db), 'initLastUpdate',
+                        lambda self: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        backend()
+    if isinstance(db, switchdb.PostgresDB):
+        # The connection went back to the pool
+        assert len(db.pool._used) == 1
+
+
+def test_last_update(db):
+    assert db.getLastUpdate() == 'Never'
+    db.initLastUpdate()
+    db.updateLastRun()
+    assert db.getLastUpdate() != 'Never'
+
+
+def test_init_last_update_race(db, monkeypatch):
+    db.updateLastRun()
+    # Another process inserted the row after we checked for it
+    monkeypatch.setattr(db, 'getLastUpdate', lambda: None)
+    db.initLastUpdate()
+    monkeypatch.undo()
+    assert db.getLastUpdate() != 'Never'
+
+
+def test_switch_lifecycle(db):
+    db.addSwitch('sw1', '10.0.0.1')
+    # Adding the same switch again is reported, not raised
+    db.addSwitch('sw1', '10.0.0.1')
+    db.updateSysInfo('sw1', '10.0.0.1', SYSINFO)
+    db.updatePorts('sw1', '10.0.0.1', PORTINFO)
+    db.updateStatus('sw1', '10.0.0.1', True)
+    summary = db.getAllSummary()
+    assert len(summary) == 1
+    assert summary[0][:4] == ('sw1', 'FOC1234X0AB', '17.3.4', '10.0.0.1')
+    assert tuple(summary[0][5:]) == (48, 30, 16, 2)
+    assert len(db.getSwitchDetail('FOC1234X0AB')) == 1
+    assert db.getCapacityStats() == [
+        ('sw1', '10.0.0.1', 'C9300-48P', '17.3.4', 48, 30)]
+
+
+def test_delete_switch_cascades(db):
+    db.addSwitch('sw1', '10.0.0.1')
+    db.addSwitch('sw2', '10.0.0.2')
+    for mgmt_ip in ('10.0.0.1', '10.0.0.2'):
+        db.addPortHistory(mgmt_ip, PORTINFO)
+        db.updateDeviceHealth(mgmt_ip, health.newHealth())
+        db.replaceDeviceIPs(mgmt_ip, [('10.1.1.1', 'aabb.cc00.0100', 'Vlan1')])
+        db.replaceInterfaces(mgmt_ip, [('Gi1/0/1', True, 'up', 1000000, None)])
+    db.deleteSwitch('10.0.0.1')
+    for table in switchdb.SWITCH_TABLES:
+        cur = db.conn.cursor()
+        cur.execute(f"SELECT DISTINCT mgmt_ip FROM {table}")
+        assert [row[0] for row in cur.fetchall()] == ['10.0.0.2'], table
+
+
+def test_sync_switches(db):
+    db.addSwitch('old', '10.0.0.9')
+    added, removed = db.syncSwitches({'10.0.0.1': 'sw1', '10.0.0.2': 'sw2'})
+    assert added == ['10.0.0.1', '10.0.0.2']
+    assert removed == ['10.0.0.9']
+    assert db.syncSwitches({'10.0.0.1': 'sw1', '10.0.0.2': 'sw2'}) == ([], [])
+    assert sorted(row[3] for row in db.getAllSummary()) == ['10.0.0.1',
+                                                            '10.0.0.2']
+
+
+def test_sync_switches_concurrent_insert(backend, monkeypatch):
+    db = backend()
+    other = backend()
+    deleteSwitches = db._deleteSwitches
+
+    def racingDelete(cur, mgmt_ips):
+        # Another collector adds the switch after our snapshot was taken
+        other.addSwitch('sw1', '10.0.0.1')
+        deleteSwitches(cur, mgmt_ips)
+
+    monkeypatch.setattr(db, '_deleteSwitches', racingDelete)
+    added, removed = db.syncSwitches({'10.0.0.1': 'sw1', '10.0.0.2': 'sw2'})
+    assert added == ['10.0.0.1', '10.0.0.2']
+    assert len(db.getAllSummary()) == 2
+
+
+def test_replace_used_ips_batches(db, monkeypatch):
+    monkeypatch.setattr(switchdb, 'COPY_BATCH', 7)
+    db.replaceUsedIPs((i, f"10.2.0.{i}") for i in range(1, 31))
+    db.replaceUsedIPs((i, f"10.3.0.{i}") for i in range(1, 21))
+    rows = db.get_used_ip()
+    assert len(rows) == 20
+    assert rows[0] == (1, '10.3.0.1')
+    assert rows[-1] == (20, '10.3.0.20')
+
+
+def test_replace_used_ips_concurrent(backend, monkeypatch):
+    db = backend()
+    bulkInsert = db._bulkInsert
+    errors = []
+
+    def otherCollector():
+        other = backend()
+        try:
+            other.replaceUsedIPs([(1, '10.4.0.1'), (2, '10.4.0.2')])
+        except Exception as e:
+            errors.append(e)
+        finally:
+            other.close()
+
+    def racingInsert(cur, table, columns, rows):
+        # Another collector rebuilds the list while ours is in flight
+        other = threading.Thread(target=otherCollector)
+        other.start()
+        time.sleep(0.5)
+        bulkInsert(cur, table, columns, rows)
+        racingInsert.other = other
+
+    monkeypatch.setattr(db, '_bulkInsert', racingInsert)
+    db.replaceUsedIPs([(1, '10.3.0.1'), (2, '10.3.0.2'), (3, '10.3.0.3')])
+    racingInsert.other.join()
+    assert errors == []
+    assert db.get_used_ip() == [(1, '10.4.0.1'), (2, '10.4.0.2')]
+
+
+def test_replace_used_ips_rolls_back(db):
+    db.replaceUsedIPs([(1, '10.2.0.1')])
+    with pytest.raises(Exception):
+        db.replaceUsedIPs([(2, '10.2.0.2'), (2, '10.2.0.2')])
+    assert db.get_used_ip() == [(1, '10.2.0.1')]
+
+
+def test_heartbeat_upsert(db):
+    db.heartbeat('collector-a', 'host-a')
+    db.heartbeat('collector-a', 'host-b')
+    db.heartbeat('collector-b', 'host-c')
+    assert db.getActiveCollectors(60) == ['collector-a', 'collector-b']
+    assert db.getActiveCollectors(-60) == []
+
+
+def test_device_health_upsert(db):
+    record = health.newHealth()
+    db.updateDeviceHealth('10.0.0.1', record)
+    record = health.recordFailure(record, now=1000)
+    db.updateDeviceHealth('10.0.0.1', record)
+    stored = db.getAllDeviceHealth()
+    assert list(stored) == ['10.0.0.1']
+    assert stored['10.0.0.1'] == record
+
+
+def test_device_ips(db, monkeypatch):
+    monkeypatch.setattr(switchdb, 'COPY_BATCH', 2)
+    db.addSwitch('sw1', '10.0.0.1')
+    records = [(f"10.1.1.{i}", f"aabb.cc00.{i:04x}", 'Vlan1')
+               for i in range(1, 6)]
+    db.replaceDeviceIPs('10.0.0.1', iter(records))
+    db.replaceDeviceIPs('10.0.0.1', iter(records[:3]))
+    # Unknown switches are not reported
+    db.replaceDeviceIPs('10.0.0.2', [('10.9.9.9', None, None)])
+    assert sorted(db.getDeviceIPs()) == ['10.1.1.1', '10.1.1.2', '10.1.1.3']
+
+
+def test_port_history(db):
+    db.addPortHistory('10.0.0.1', PORTINFO)
+    rows = db.getPortHistory(0)
+    assert len(rows) == 1
+    assert rows[0][0] == '10.0.0.1'
+    assert tuple(rows[0][2:]) == (48, 30)
+    assert db.getPortHistory(rows[0][1] + 1) == []
+
+
+def test_prune_port_history(db):
+    db.addPortHistory('10.0.0.1', PORTINFO)
+    cur = db.conn.cursor()
+    cur.execute(db._q(""" INSERT INTO port_history(mgmt_ip, ts, total_port, up_port)
+                          values(?,?,?,?); """), ('10.0.0.1', 1000, 48, 10))
+    db.conn.commit()
+    assert db.prunePortHistory(2000) == 1
+    assert len(db.getPortHistory(0)) == 1
+
+
+def test_history_sums(db):
+    cur = db.conn.cursor()
+    cur.executemany(db._q(""" INSERT INTO port_history(mgmt_ip, ts, total_port, up_port)
+                              values(?,?,?,?); """),
+                    [('10.0.0.1', 1000, 48, 10),
+                     ('10.0.0.1', 1000 + 86400, 48, 12),
+                     ('10.0.0.1', 1000 + 2 * 86400, 48, 20),
+                     ('10.0.0.2', 1000 + 86400, 48, 5),
+                     ('10.0.0.2', 999, 48, 40)])
+    db.conn.commit()
+    sums = {row[0]: tuple(row[1:]) for row in db.getHistorySums(1000)}
+    assert sums == {'10.0.0.1': (3, 3.0, 42.0, 5.0, 52.0),
+                    '10.0.0.2': (1, 1.0, 5.0, 1.0, 5.0)}
+
+
+def test_export_rows_batches(db):
+    db.syncSwitches({f"10.0.0.{i}": f"sw{i}" for i in range(1, 6)})
+    batches = db.exportRows('switches', batch=2)
+    columns = next(batches)
+    assert columns[:2] == ['name', 'serial']
+    sizes = [len(rows) for rows in batches]
+    assert sizes == [2, 2, 1]
+
+
+def test_export_rows_all_datasets(db):
+    for dataset in switchdb.EXPORT_QUERIES:
+        batches = list(db.exportRows(dataset))
+        assert batches[0], dataset
+
+
+def test_postgres_export_uses_named_cursor(backend):
+    db = backend()
+    if not isinstance(db, switchdb.PostgresDB):
+        pytest.skip("server-side cursors are PostgreSQL only")
+    assert db._streamCursor().name == 'export'
+
+
+def test_postgres_hypertable(backend):
+    db = backend()
+    if not isinstance(db, switchdb.PostgresDB):
+        pytest.skip("hypertables are TimescaleDB only")
+    cur = db.conn.cursor()
+    cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'timescaledb'")
+    if not cur.fetchone():
+        pytest.skip("TimescaleDB extension not installed")
+    cur.execute(""" SELECT 1 FROM timescaledb_information.hypertables
+                    WHERE hypertable_name = 'port_history'
+                    AND hypertable_schema = current_schema(); """)
+    assert cur.fetchone()
+
+
+def test_postgres_pool_exhausted(backend):
+    db = backend()
+    if not isinstance(db, switchdb.PostgresDB):
+        pytest.skip("connection pools are PostgreSQL only")
+    import psycopg2.pool
+    for _ in range(switchdb.DB_POOL_MAX - 1):
+        backend()
+    with pytest.raises(psycopg2.pool.PoolError):
+        backend()